@@ -60,11 +60,180 @@ Usage
 import os
 import sys
 import fitz
+import numpy as np
 
 
-def column_boxes(page, footer_margin=50, header_margin=50, no_image_text=True):
-    """Determine bboxes which wrap a column."""
-    paths = page.get_drawings()
+class BBoxIndex:
+    """Grid-based spatial index over a list of rectangles.
+
+    Behaves like the plain list it wraps: items keep their position, can be
+    appended, replaced or set to None. Lookups only test the rectangles
+    sharing a grid cell with the query, but return exactly what a linear
+    scan of the list would return.
+    """
+
+    MAX_CELLS = 4096  # larger rectangles are not gridded, but always checked
+
+    def __init__(self, rects=(), cell=50):
+        self.cell = cell
+        self.rects = []
+        self.grid = {}
+        self.wide = set()
+        for r in rects:
+            self.append(r)
+
+    def __len__(self):
+        return len(self.rects)
+
+    def __getitem__(self, i):
+        return self.rects[i]
+
+    def __setitem__(self, i, r):
+        self._remove(i, self.rects[i])
+        self.rects[i] = r
+        self._add(i, r)
+
+    def append(self, r):
+        self.rects.append(r)
+        self._add(len(self.rects) - 1, r)
+
+    def _cells(self, r):
+        """Return the grid cells covered by r, or None if r is too large."""
+        c = self.cell
+        xs = range(int(r.x0 // c), int(r.x1 // c) + 1)
+        ys = range(int(r.y0 // c), int(r.y1 // c) + 1)
+        if len(xs) * len(ys) > self.MAX_CELLS:
+            return None
+        return [(x, y) for x in xs for y in ys]
+
+    def _add(self, i, r):
+        # invalid rectangles (x0 > x1 or y0 > y1) can neither contain nor
+        # intersect anything, so they need no cells
+        if r is None or r.x0 > r.x1 or r.y0 > r.y1:
+            return
+        cells = self._cells(r)
+        if cells is None:
+            self.wide.add(i)
+            return
+        for key in cells:
+            self.grid.setdefault(key, set()).add(i)
+
+    def _remove(self, i, r):
+        self.wide.discard(i)
+        if r is None or r.x0 > r.x1 or r.y0 > r.y1:
+            return
+        cells = self._cells(r)
+        if cells is None:
+            return
+        for key in cells:
+            self.grid[key].discard(i)
+
+    def candidates(self, r):
+        """Indices of items which may intersect r."""
+        cells = self._cells(r)
+        if cells is None:
+            return range(len(self.rects))
+        found = set(self.wide)
+        for key in cells:
+            found.update(self.grid.get(key, ()))
+        return found
+
+    def intersects(self, bb, skip=None):
+        """Return True if an item other than None or 'skip' intersects bb."""
+        if bb.is_empty:
+            return False
+        for i in self.candidates(bb):
+            b = self.rects[i]
+            if b is None or (skip is not None and b == skip):
+                continue
+            if not (bb & b).is_empty:
+                return True
+        return False
+
+
+class RectArray:
+    """Fixed set of rectangles stored as an N x 4 integer array.
+
+    Containment and intersection tests against all items are done with
+    vectorized masks, following the semantics of IRect's "in" and "&".
+    Used for the static path, image and vertical text bboxes of a page.
+    """
+
+    def __init__(self, rects=(), coords=None):
+        self.rects = list(rects)
+        if coords is None:
+            coords = self._as_array(self.rects)
+        self.coords = coords
+
+    def __len__(self):
+        return len(self.rects)
+
+    def __add__(self, other):
+        return RectArray(
+            self.rects + other.rects, np.concatenate((self.coords, other.coords))
+        )
+
+    @staticmethod
+    def _as_array(bbs):
+        return np.array(
+            [(b.x0, b.y0, b.x1, b.y1) for b in bbs], dtype=np.int64
+        ).reshape(-1, 4)
+
+    def contains_matrix(self, bbs):
+        """Boolean K x N matrix: item n contains bbs[k]."""
+        q = self._as_array(bbs)[:, None, :]
+        c = self.coords[None, :, :]
+        return (
+            (c[..., 0] <= q[..., 0]) & (q[..., 0] <= q[..., 2]) & (q[..., 2] <= c[..., 2])
+            & (c[..., 1] <= q[..., 1]) & (q[..., 1] <= q[..., 3]) & (q[..., 3] <= c[..., 3])
+        )
+
+    def intersects_matrix(self, bbs):
+        """Boolean K x N matrix: item n and bbs[k] have a non-empty intersection."""
+        q = self._as_array(bbs)[:, None, :]
+        c = self.coords[None, :, :]
+        return (
+            (np.maximum(c[..., 0], q[..., 0]) < np.minimum(c[..., 2], q[..., 2]))
+            & (np.maximum(c[..., 1], q[..., 1]) < np.minimum(c[..., 3], q[..., 3]))
+        )
+
+    def first_containing_many(self, bbs):
+        """For each of bbs, the 1-based number of the first item containing it, else 0."""
+        if not len(bbs):
+            return []
+        if not self.rects:
+            return [0] * len(bbs)
+        mask = self.contains_matrix(bbs)
+        return np.where(mask.any(axis=1), mask.argmax(axis=1) + 1, 0).tolist()
+
+    def intersects_many(self, bbs):
+        """For each of bbs, True if any item intersects it."""
+        if not len(bbs):
+            return []
+        if not self.rects:
+            return [False] * len(bbs)
+        return self.intersects_matrix(bbs).any(axis=1).tolist()
+
+    def first_containing(self, bb):
+        """Return 1-based number of the first item containing bb, else 0."""
+        return self.first_containing_many([bb])[0]
+
+    def intersects(self, bb):
+        """Return True if any item intersects bb."""
+        return self.intersects_many([bb])[0]
+
+
+def column_boxes(page, footer_margin=50, header_margin=50, no_image_text=True, blocks=None):
+    """Determine bboxes which wrap a column.
+
+    If 'blocks' is given, it is used instead of extracting the text blocks
+    again. It must be the "blocks" list of a page.get_text("dict") result
+    covering the same area as the clip computed below. Image blocks in it
+    are ignored.
+    """
+    # only the path rectangles are needed: the C version avoids converting
+    # every path item to Python objects
+    paths = page.get_cdrawings()
     bboxes = []
 
     # path rectangles
@@ -86,33 +255,20 @@ def column_boxes(page, footer_margin=50, header_margin=50, no_image_text=True):
         """Determines whether rectangle 'temp' can be extended by 'bb'
         without intersecting any of the rectangles contained in 'bboxlist'.
 
-        Items of bboxlist may be None if they have been removed.
+        Items of bboxlist (a BBoxIndex) may be None if they have been removed.
 
         Returns:
             True if 'temp' has no intersections with items of 'bboxlist'.
         """
-        for b in bboxlist:
-            if not intersects_bboxes(temp, vert_bboxes) and (
-                b == None or b == bb or (temp & b).is_empty
-            ):
-                continue
+        if len(bboxlist) == 0:
+            return True
+        if vert_bboxes.intersects(temp):
             return False
-
-        return True
+        return not bboxlist.intersects(temp, skip=bb)
 
     def in_bbox(bb, bboxes):
-        """Return 1-based number if a bbox contains bb, else return 0."""
-        for i, bbox in enumerate(bboxes):
-            if bb in bbox:
-                return i + 1
-        return 0
-
-    def intersects_bboxes(bb, bboxes):
-        """Return True if a bbox intersects bb, else return False."""
-        for bbox in bboxes:
-            if not (bb & bbox).is_empty:
-                return True
-        return False
+        """Return 1-based number if a bbox of the RectArray contains bb, else return 0."""
+        return bboxes.first_containing(bb)
 
     def extend_right(bboxes, width, path_bboxes, vert_bboxes, img_bboxes):
         """Extend a bbox to the right page border.
@@ -123,35 +279,44 @@ def column_boxes(page, footer_margin=50, header_margin=50, no_image_text=True):
         Args:
             bboxes: (list[IRect]) bboxes to check
             width: (int) page width
-            path_bboxes: (list[IRect]) bboxes with a background color
-            vert_bboxes: (list[IRect]) bboxes with vertical text
-            img_bboxes: (list[IRect]) bboxes of images
+            path_bboxes: (RectArray) bboxes with a background color
+            vert_bboxes: (RectArray) bboxes with vertical text
+            img_bboxes: (RectArray) bboxes of images
         Returns:
             Potentially modified bboxes.
         """
-        for i, bb in enumerate(bboxes):
+        # the tests against the static bboxes only depend on the original
+        # bb, so they are done for all bboxes at once
+        temps = []
+        for bb in bboxes:
+            # temp extends bb to the right page border
+            temp = +bb
+            temp.x1 = width
+            temps.append(temp)
+        in_path = path_bboxes.first_containing_many(bboxes)
+        in_img = img_bboxes.first_containing_many(bboxes)
+        blocked = (path_bboxes + vert_bboxes + img_bboxes).intersects_many(temps)
+
+        bboxes = BBoxIndex(bboxes)
+        for i, temp in enumerate(temps):
             # do not extend text with background color
-            if in_bbox(bb, path_bboxes):
+            if in_path[i]:
                 continue
 
             # do not extend text in images
-            if in_bbox(bb, img_bboxes):
+            if in_img[i]:
                 continue
 
-            # temp extends bb to the right page border
-            temp = +bb
-            temp.x1 = width
-
             # do not cut through colored background or images
-            if intersects_bboxes(temp, path_bboxes + vert_bboxes + img_bboxes):
+            if blocked[i]:
                 continue
 
             # also, do not intersect other text bboxes
-            check = can_extend(temp, bb, bboxes)
+            check = can_extend(temp, bboxes[i], bboxes)
             if check:
                 bboxes[i] = temp  # replace with enlarged bbox
 
-        return [b for b in bboxes if b != None]
+        return [b for b in bboxes.rects if b != None]
 
     def clean_nblocks(nblocks):
         """Do some elementary cleaning."""
@@ -192,25 +357,32 @@ def column_boxes(page, footer_margin=50, header_margin=50, no_image_text=True):
 
     # extract vector graphics
     for p in paths:
-        path_rects.append(p["rect"].irect)
+        path_rects.append(fitz.Rect(p["rect"]).irect)
     path_bboxes = path_rects
 
     # sort path bboxes by ascending top, then left coordinates
     path_bboxes.sort(key=lambda b: (b.y0, b.x0))
+    path_bboxes = RectArray(path_bboxes)
 
     # bboxes of images on page, no need to sort them
     for item in page.get_images():
         img_bboxes.extend(page.get_image_rects(item[0]))
+    img_bboxes = RectArray(img_bboxes)
 
     # blocks of text on page
-    blocks = page.get_text(
-        "dict",
-        flags=fitz.TEXTFLAGS_TEXT,
-        clip=clip,
-    )["blocks"]
+    if blocks is None:
+        blocks = page.get_text(
+            "dict",
+            flags=fitz.TEXTFLAGS_TEXT,
+            clip=clip,
+        )["blocks"]
 
     # Make block rectangles, ignoring non-horizontal text
     for b in blocks:
+        # skip image blocks of a shared "dict" extraction
+        if b["type"] != 0:
+            continue
+
         bbox = fitz.IRect(b["bbox"])  # bbox of the block
 
         # ignore text written upon images
@@ -234,8 +406,15 @@ def column_boxes(page, footer_margin=50, header_margin=50, no_image_text=True):
         if not bbox.is_empty:
             bboxes.append(bbox)
 
+    vert_bboxes = RectArray(vert_bboxes)
+
     # Sort text bboxes by ascending background, top, then left coordinates
-    bboxes.sort(key=lambda k: (in_bbox(k, path_bboxes), k.y0, k.x0))
+    backgrounds = path_bboxes.first_containing_many(bboxes)
+    order = sorted(
+        range(len(bboxes)),
+        key=lambda i: (backgrounds[i], bboxes[i].y0, bboxes[i].x0),
+    )
+    bboxes = [bboxes[i] for i in order]
 
     # Extend bboxes to the right where possible
     bboxes = extend_right(
@@ -250,10 +429,10 @@ def column_boxes(page, footer_margin=50, header_margin=50, no_image_text=True):
     # Join bboxes to establish some column structure
     # --------------------------------------------------------------------
     # the final block bboxes on page
-    nblocks = [bboxes[0]]  # pre-fill with first bbox
-    bboxes = bboxes[1:]  # remaining old bboxes
+    nblocks = BBoxIndex([bboxes[0]])  # pre-fill with first bbox
+    bboxes = BBoxIndex(bboxes[1:])  # remaining old bboxes
 
-    for i, bb in enumerate(bboxes):  # iterate old bboxes
+    for i, bb in enumerate(list(bboxes.rects)):  # iterate old bboxes
         check = False  # indicates unwanted joins
 
         # check if bb can extend one of the new blocks
@@ -287,7 +466,7 @@ def column_boxes(page, footer_margin=50, header_margin=50, no_image_text=True):
         bboxes[i] = None
 
     # do some elementary cleaning
-    nblocks = clean_nblocks(nblocks)
+    nblocks = clean_nblocks(nblocks.rects)
 
     # return identified text bboxes
     return nblocks
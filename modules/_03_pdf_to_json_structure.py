@@ -9,6 +9,10 @@ import sys
 import json
 import fitz
 import os
+import math
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 from _01_multi_column import column_boxes
 from _02_reading_order_sort import sort_by_reading_order
@@ -19,105 +23,210 @@ def serialize_rect(rect):
         return None
     return {"x0": rect.x0, "y0": rect.y0, "x1": rect.x1, "y1": rect.y1}
 
-def extract_pdf_structure(pdf_path, footer_margin=0, header_margin=0, no_image_text=False):
+def can_share_text_dict(page, footer_margin, header_margin):
     """
-    PDF を解析して JSON 構造を生成する。
+    column_boxes と構造抽出で同じ get_text("dict") の結果を共有できるか判定する。
+    column_boxes はページ矩形で、構造抽出は mediabox でクリップするため、
+    両者が一致し、ヘッダ/フッタの余白を取らない場合のみ共有する。
     """
-    try:
-        doc = fitz.open(pdf_path)
-    except Exception as e:
-        print(f"Failed to open PDF: {e}")
-        return []
+    return (
+        footer_margin == 0
+        and header_margin == 0
+        and page.rotation == 0
+        and page.cropbox == page.mediabox
+    )
+
+def extract_page_structure(page, footer_margin=0, header_margin=0, no_image_text=False):
+    """
+    1ページ分の構造を抽出して dict で返す。
+    テキスト解析（get_text("dict")）は可能な限り1ページ1回で済ませる。
+    """
+    text_dict = page.get_text("dict")
+    shared_blocks = None
+    if can_share_text_dict(page, footer_margin, header_margin):
+        shared_blocks = text_dict["blocks"]
+
+    zones = column_boxes(
+        page,
+        footer_margin=footer_margin,
+        header_margin=header_margin,
+        no_image_text=no_image_text,
+        blocks=shared_blocks,
+    )
+    ro_zones = sort_by_reading_order(zones, page.rect.width)
+    zones_with_id = [{"zone_number": i + 1, "rect": zone} for i, zone in enumerate(ro_zones)]
+
+    page_data = {
+        "page": page.number + 1,
+        "width": page.rect.width,
+        "height": page.rect.height,
+        "zones": []
+    }
 
-    pdf_data = []
-    for page_index, page in enumerate(doc):
-        zones = column_boxes(
-            page,
-            footer_margin=footer_margin,
-            header_margin=header_margin,
-            no_image_text=no_image_text,
-        )
-        ro_zones = sort_by_reading_order(zones, page.rect.width)
-        zones_with_id = [{"zone_number": i + 1, "rect": zone} for i, zone in enumerate(ro_zones)]
-
-        page_data = {
-            "page": page_index + 1,
-            "width": page.rect.width,
-            "height": page.rect.height,
-            "zones": []
+    zone_map = {}
+    for z in zones_with_id:
+        zone_map[z["zone_number"]] = {
+            "zone_number": z["zone_number"],
+            "rect": serialize_rect(z["rect"]),
+            "blocks": []
         }
 
-        zone_map = {}
+    for block in text_dict.get("blocks", []):
+        bbox = fitz.IRect(block["bbox"])
+        matched_zone = None
+
         for z in zones_with_id:
-            zone_map[z["zone_number"]] = {
-                "zone_number": z["zone_number"],
-                "rect": serialize_rect(z["rect"]),
-                "blocks": []
-            }
-
-        text_dict = page.get_text("dict")
-        for block in text_dict.get("blocks", []):
-            bbox = fitz.IRect(block["bbox"])
-            matched_zone = None
-
-            for z in zones_with_id:
-                if bbox in z["rect"]:
-                    matched_zone = z["zone_number"]
-                    break
-
-            block_data = {
-                "block_bbox": block["bbox"],
-                "block_number": block.get("number", 0),
-                "lines": []
-            }
-
-            span_count = 0
-            for line in block.get("lines", []):
-                line_spans = []
-                for span in line.get("spans", []):
-                    span_count += 1
-                    line_spans.append({
-                        "span_bbox": span["bbox"],
-                        "text": span["text"],
-                        "font": span.get("font", ""),
-                        "size": span.get("size", 0),
-                        "color": span.get("color", [0, 0, 0]),
-                        "alpha": span.get("alpha", 1),
-                        "bold": bool(span.get("flags", 0) & fitz.TEXT_FONT_BOLD),
-                        "italic": bool(span.get("flags", 0) & fitz.TEXT_FONT_ITALIC)
-                    })
-                if line_spans:
-                    line_data = {
-                        "line_bbox": line["bbox"],
-                        "spans": line_spans
-                    }
-                    block_data["lines"].append(line_data)
-
-            if span_count == 0:
-                continue
-
-            if matched_zone is not None:
-                zone_map[matched_zone]["blocks"].append(block_data)
-            else:
-                if 0 not in zone_map:
-                    zone_map[0] = {"zone_number": 0, "rect": None, "blocks": []}
-                zone_map[0]["blocks"].append(block_data)
-
-        page_data["zones"] = list(zone_map.values())
-        pdf_data.append(page_data)
+            if bbox in z["rect"]:
+                matched_zone = z["zone_number"]
+                break
+
+        block_data = {
+            "block_bbox": block["bbox"],
+            "block_number": block.get("number", 0),
+            "lines": []
+        }
+
+        span_count = 0
+        for line in block.get("lines", []):
+            line_spans = []
+            for span in line.get("spans", []):
+                span_count += 1
+                line_spans.append({
+                    "span_bbox": span["bbox"],
+                    "text": span["text"],
+                    "font": span.get("font", ""),
+                    "size": span.get("size", 0),
+                    "color": span.get("color", [0, 0, 0]),
+                    "alpha": span.get("alpha", 1),
+                    "bold": bool(span.get("flags", 0) & fitz.TEXT_FONT_BOLD),
+                    "italic": bool(span.get("flags", 0) & fitz.TEXT_FONT_ITALIC)
+                })
+            if line_spans:
+                line_data = {
+                    "line_bbox": line["bbox"],
+                    "spans": line_spans
+                }
+                block_data["lines"].append(line_data)
+
+        if span_count == 0:
+            continue
+
+        if matched_zone is not None:
+            zone_map[matched_zone]["blocks"].append(block_data)
+        else:
+            if 0 not in zone_map:
+                zone_map[0] = {"zone_number": 0, "rect": None, "blocks": []}
+            zone_map[0]["blocks"].append(block_data)
+
+    page_data["zones"] = list(zone_map.values())
+    return page_data
+
+def _extract_pages(args):
+    """
+    ワーカープロセス用。PDF を個別に開き、指定ページ（0始まり）の構造をリストで返す。
+    """
+    pdf_path, page_indices, footer_margin, header_margin, no_image_text = args
+    doc = fitz.open(pdf_path)
+    try:
+        return [
+            extract_page_structure(doc[i], footer_margin, header_margin, no_image_text)
+            for i in page_indices
+        ]
+    finally:
+        doc.close()
+
+# 並列処理で1タスクに割り当てる最大ページ数。処理中に保持するページ数の上限になる
+MAX_CHUNK_PAGES = 8
+
+def split_pages(page_indices, workers):
+    """
+    ページのリストを連続したチャンクに分割する。
+    ワーカー数の4倍程度に分けるが、1チャンクは MAX_CHUNK_PAGES ページまでとする。
+    """
+    page_count = len(page_indices)
+    chunk_size = max(1, min(MAX_CHUNK_PAGES, math.ceil(page_count / (workers * 4))))
+    return [page_indices[i:i + chunk_size] for i in range(0, page_count, chunk_size)]
 
+def get_pdf_info(doc, pdf_path):
+    """
+    ページ以外の文書情報を dict で返す。
+    """
     title = doc.metadata.get("title", "").strip()
     if not title:
         title = os.path.basename(pdf_path)
-    result = {
+    return {
         "src_filename": pdf_path,
         "title": title,
         "width": doc[0].rect.width,
         "height": doc[0].rect.height,
         "page_count": doc.page_count,
-        "pages": pdf_data
     }
 
+def iter_pdf_structure(pdf_path, footer_margin=0, header_margin=0, no_image_text=False, workers=1, pages=None):
+    """
+    PDF を解析し、ページ構造を1ページずつ返すジェネレータ。
+    workers が2以上の場合はページをチャンクに分けてプロセスプールで並列に解析する。
+    投入するチャンクはワーカー数の2倍までに抑え、ページ順に返す。
+    pages にページ番号（1始まり）のリストを指定した場合は、そのページだけを解析する。
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        if workers is None or workers < 1:
+            workers = os.cpu_count() or 1
+
+        if pages is None:
+            page_indices = list(range(doc.page_count))
+        else:
+            page_indices = sorted({p - 1 for p in pages if 1 <= p <= doc.page_count})
+
+        if workers > 1 and len(page_indices) > 1:
+            chunks = iter(split_pages(page_indices, workers))
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                def submit(chunk):
+                    return executor.submit(
+                        _extract_pages,
+                        (pdf_path, chunk, footer_margin, header_margin, no_image_text),
+                    )
+
+                pending = deque(submit(chunk) for chunk in itertools.islice(chunks, workers * 2))
+                try:
+                    while pending:
+                        # 投入順に結果を受け取るので、ページ順はそのまま保たれる
+                        chunk_pages = pending.popleft().result()
+                        for chunk in itertools.islice(chunks, 1):
+                            pending.append(submit(chunk))
+                        yield from chunk_pages
+                except GeneratorExit:
+                    # 途中で打ち切られた場合は、まだ始まっていないチャンクを取り消す
+                    for future in pending:
+                        future.cancel()
+                    raise
+        else:
+            for i in page_indices:
+                yield extract_page_structure(doc[i], footer_margin, header_margin, no_image_text)
+    finally:
+        doc.close()
+
+def extract_pdf_structure(pdf_path, footer_margin=0, header_margin=0, no_image_text=False, workers=1, pages=None):
+    """
+    PDF を解析して JSON 構造を生成する。
+    全ページをメモリ上に持つため、大きな PDF では iter_pdf_structure を使う。
+    workers が2以上の場合はページ範囲をプロセスプールに分配して並列に解析する。
+    結果は逐次処理と同一になる。
+    pages にページ番号（1始まり）のリストを指定した場合は、そのページだけを解析する。
+    """
+    try:
+        doc = fitz.open(pdf_path)
+    except Exception as e:
+        print(f"Failed to open PDF: {e}")
+        return []
+
+    result = get_pdf_info(doc, pdf_path)
+    doc.close()
+    result["pages"] = list(iter_pdf_structure(
+        pdf_path, footer_margin, header_margin, no_image_text, workers=workers, pages=pages
+    ))
+
     return result
 
 def main():
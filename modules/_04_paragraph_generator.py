@@ -4,11 +4,12 @@ PyMuPdfで生成した階層化されたJSON構造をフラットな翻訳状態
 
 import datetime
 
-def generate_paragraphs(json_data):
+def generate_paragraphs(json_data, start_id=1):
     """
     json_data: ページ情報のリスト。各ページは "zones" キーを持ち、
                各 zone は "blocks" キー、各 block は "lines" キー、
                各 line は "spans" キー（span は dictで "font", "size", "text" など）を持つ想定です。
+    start_id: 最初の段落に振る id と order。既存の book_data に追加する場合に重複しない値を指定する。
                
     戻り値: {
         "head_styles": {スタイルクラス名: "font-family: フォント名; font-size: フォントサイズpx;", ...},
@@ -31,16 +32,49 @@ def generate_paragraphs(json_data):
       - modified_at: 最終編集日時（ISO 8601形式）
       - comments: 翻訳時のメモや注釈（空リスト）
     """
-    paragraphs = []
-    current_paragraph = {
-        "page": 0,
-        "text": "",
-        "html": "",
-        "isspanopen": False,
-        "currentSpanStyle": "",
-        "lastY": 0  # 前の line_bbox[1]
-    }
     style_dict = {}
+    paragraphs = list(iter_paragraphs(json_data, style_dict, start_id=start_id))
+
+    ## スタイル辞書をソートして出力
+    style_dict = {k: v for k, v in sorted(style_dict.items(), key=lambda x: x[0])}
+
+    return {"head_styles": style_dict, "paragraphs": paragraphs}
+
+def iter_page_lines(page):
+    """
+    1ページ分の構造から line を順に返す。
+    """
+    for zone in page.get("zones", []):
+        for block in zone.get("blocks", []):
+            for line in block.get("lines", []):
+                yield line
+
+def iter_paragraphs(pages, style_dict, start_id=1):
+    """
+    ページ構造を1ページずつ受け取り、段落が閉じるたびに段落オブジェクトを返すジェネレータ。
+    pages はリストでもジェネレータでもよく、保持するのは処理中のページと段落だけになる。
+
+    style_dict: 使われたスタイルクラスを書き込む dict（呼び出し側で用意する）
+    start_id: 最初の段落に振る id と order
+    出力される段落オブジェクトの内容は generate_paragraphs を参照。
+    """
+    now = datetime.datetime.now().isoformat()
+    next_id = start_id
+
+    def new_paragraph(span_style="", last_y=0):
+        # text と html は断片をリストに溜め、段落を閉じるときに1回だけ連結する
+        return {
+            "page": 0,
+            "text_parts": [],
+            "html_parts": [],
+            "last_char": "",          # text の末尾の文字
+            "last_visible_char": "",  # text.rstrip() の末尾の文字
+            "isspanopen": False,
+            "currentSpanStyle": span_style,
+            "lastY": last_y  # 前の line_bbox[1]
+        }
+
+    current_paragraph = new_paragraph()
 
     def get_span_style(span):
         # フォントサイズを最も近い0.5に丸める
@@ -54,125 +88,113 @@ def generate_paragraphs(json_data):
             style_dict[class_name] = f"font-family: {span['font']}; font-size: {rounded_size}px;"
         return class_name
 
-    # JSONからすべての line を一括取得
-    lines = []
-    for page in json_data:
-        if "zones" in page:
-            for zone in page["zones"]:
-                if "blocks" in zone:
-                    for block in zone["blocks"]:
-                        if "lines" in block:
-                            for line in block["lines"]:
-                                line["page"] = page["page"]
-                                lines.append(line)
-
     def close_paragraph():
-        nonlocal current_paragraph
-        if current_paragraph["isspanopen"]:
-            current_paragraph["html"] += "</span>"
-            current_paragraph["isspanopen"] = False
-        # current_paragraph をコピーして追加
-        paragraphs.append(current_paragraph.copy())
-        # 前回の currentSpanStyle と lastY を引き継いで初期化
-        current_paragraph = {
-            "page": 0,
-            "text": "",
-            "html": "",
-            "isspanopen": False,
-            "currentSpanStyle": current_paragraph["currentSpanStyle"],
-            "lastY": current_paragraph["lastY"]
+        """
+        current_paragraph を閉じて出力形式に変換し、次の段落を開始する。
+        戻り値: (閉じた段落の出力オブジェクト, 新しい current_paragraph)
+        """
+        nonlocal next_id
+        para = current_paragraph
+        if para["isspanopen"]:
+            para["html_parts"].append("</span>")
+            para["isspanopen"] = False
+        text = "".join(para["text_parts"])
+        output = {
+            "id": next_id,
+            "page": para.get("page", 0),
+            "order": next_id,
+            "first_line_bbox": para.get("first_line_bbox", ""),
+            "src_html": "".join(para["html_parts"]),
+            "src_text": text,
+            "src_replaced": text,
+            "trans_auto": "",
+            "trans_text": text,
+            "trans_status": "none",
+            "block_tag": "p",
+            "parent_id": 0,
+            "modified_at": now,
+            "comments": []
         }
-        return current_paragraph
+        next_id += 1
+        # 前回の currentSpanStyle と lastY を引き継いで初期化
+        return output, new_paragraph(para["currentSpanStyle"], para["lastY"])
 
-    def join_line_text(line, current_paragraph):
+    def join_line_text(line, page_number, current_paragraph):
         # first_line_bboxが無ければ追加
         if "first_line_bbox" not in current_paragraph:
             current_paragraph["first_line_bbox"] = line["line_bbox"]
+        text_parts = current_paragraph["text_parts"]
+        html_parts = current_paragraph["html_parts"]
         for span in line.get("spans", []):
             if current_paragraph["page"] == 0:
-                current_paragraph["page"] = line["page"]
+                current_paragraph["page"] = page_number
             new_style = get_span_style(span)
             # スタイルが変わったら span をクローズして新しい span を開く
             if current_paragraph["currentSpanStyle"] != new_style:
                 if current_paragraph["isspanopen"]:
-                    current_paragraph["html"] += "</span>"
+                    html_parts.append("</span>")
                     current_paragraph["isspanopen"] = False
             # span が開いていない場合は新しい span を開く
             if not current_paragraph["isspanopen"]:
                 current_paragraph["currentSpanStyle"] = new_style
-                current_paragraph["html"] += f'<span class="{new_style}">'
+                html_parts.append(f'<span class="{new_style}">')
                 current_paragraph["isspanopen"] = True
             # タブ文字は </span>|<span class="new_style"> に変換
-            processed_text = span["text"].replace("\t", f'</span>|<span class="{new_style}">')
-            current_paragraph["text"] += span["text"]
-            current_paragraph["html"] += processed_text
+            text = span["text"]
+            processed_text = text.replace("\t", f'</span>|<span class="{new_style}">')
+            text_parts.append(text)
+            html_parts.append(processed_text)
+            if text:
+                current_paragraph["last_char"] = text[-1]
+                visible = text.rstrip()
+                if visible:
+                    current_paragraph["last_visible_char"] = visible[-1]
             # line_bbox[1] を更新（line_bbox はリスト形式と想定）
             current_paragraph["lastY"] = line["line_bbox"][1]
         return current_paragraph
 
-    for line in lines:
-        # spans が存在しない場合はスキップ
-        if "spans" not in line or not line["spans"]:
-            continue
-
-        # 前の line と同じ Y 座標の場合は同じ段落に結合
-        if current_paragraph["lastY"] == line["line_bbox"][1]:
-            current_paragraph = join_line_text(line, current_paragraph)
-        else:
-            # 現在の文末がタブ文字の場合はlineのtextを結合
-            if current_paragraph["text"].endswith("\t"):
-                current_paragraph = join_line_text(line, current_paragraph)
-            # 現在の文末が句読点の場合はパラグラフをクローズして新しい段落を開始
-            elif current_paragraph["text"].rstrip() and current_paragraph["text"].rstrip()[-1] in ".!?":
-                current_paragraph = close_paragraph()
-                current_paragraph = join_line_text(line, current_paragraph)
-            # 文末がスペースの場合は結合
-            elif current_paragraph["text"].endswith(" ") and (current_paragraph["currentSpanStyle"] == get_span_style(line["spans"][0])):
-                current_paragraph = join_line_text(line, current_paragraph)
-            # 文末がハイフンの場合は結合
-            elif current_paragraph["text"].endswith("-") and (current_paragraph["currentSpanStyle"] == get_span_style(line["spans"][0])):
-                current_paragraph = join_line_text(line, current_paragraph)
-            # # 現在の文末が英語か数字で、lineのtextが英語小文字か数字で始まり、スタイルが同一なら結合
-            # あまり適切に動作しないのでコメントアウト
-            # elif current_paragraph["text"] and \
-            #         current_paragraph["text"][-1].isalnum() and \
-            #         line["spans"][0]["text"][0].isalnum() and \
-            #         (current_paragraph["currentSpanStyle"] == get_span_style(line["spans"][0])):
-            #     current_paragraph = join_line_text(line, current_paragraph)
+    for page in pages:
+        page_number = page["page"]
+        for line in iter_page_lines(page):
+            # spans が存在しない場合はスキップ
+            if "spans" not in line or not line["spans"]:
+                continue
+
+            # 前の line と同じ Y 座標の場合は同じ段落に結合
+            if current_paragraph["lastY"] == line["line_bbox"][1]:
+                current_paragraph = join_line_text(line, page_number, current_paragraph)
             else:
-                # それ以外の場合はパラグラフをクローズして新しい段落を開始
-                current_paragraph = close_paragraph()
-                current_paragraph = join_line_text(line, current_paragraph)
+                # 現在の文末がタブ文字の場合はlineのtextを結合
+                if current_paragraph["last_char"] == "\t":
+                    current_paragraph = join_line_text(line, page_number, current_paragraph)
+                # 現在の文末が句読点の場合はパラグラフをクローズして新しい段落を開始
+                elif current_paragraph["last_visible_char"] and current_paragraph["last_visible_char"] in ".!?":
+                    closed, current_paragraph = close_paragraph()
+                    yield closed
+                    current_paragraph = join_line_text(line, page_number, current_paragraph)
+                # 文末がスペースの場合は結合
+                elif current_paragraph["last_char"] == " " and (current_paragraph["currentSpanStyle"] == get_span_style(line["spans"][0])):
+                    current_paragraph = join_line_text(line, page_number, current_paragraph)
+                # 文末がハイフンの場合は結合
+                elif current_paragraph["last_char"] == "-" and (current_paragraph["currentSpanStyle"] == get_span_style(line["spans"][0])):
+                    current_paragraph = join_line_text(line, page_number, current_paragraph)
+                # # 現在の文末が英語か数字で、lineのtextが英語小文字か数字で始まり、スタイルが同一なら結合
+                # あまり適切に動作しないのでコメントアウト
+                # elif current_paragraph["text"] and \
+                #         current_paragraph["text"][-1].isalnum() and \
+                #         line["spans"][0]["text"][0].isalnum() and \
+                #         (current_paragraph["currentSpanStyle"] == get_span_style(line["spans"][0])):
+                #     current_paragraph = join_line_text(line, page_number, current_paragraph)
+                else:
+                    # それ以外の場合はパラグラフをクローズして新しい段落を開始
+                    closed, current_paragraph = close_paragraph()
+                    yield closed
+                    current_paragraph = join_line_text(line, page_number, current_paragraph)
 
     # ループ終了後、残った段落をクローズ
-    if current_paragraph["text"]:
-        close_paragraph()
-
-    # ----- ここから出力オブジェクトの変換処理（ロジック自体は変更せず） -----
-    now = datetime.datetime.now().isoformat()
-    output_paragraphs = []
-    for idx, para in enumerate(paragraphs):
-        output_paragraphs.append({
-            "id": idx + 1,
-            "page": para.get("page", 0),
-            "order": idx + 1,
-            "first_line_bbox": para.get("first_line_bbox", ""),
-            "src_html": para.get("html", ""),
-            "src_text": para.get("text", ""),
-            "src_replaced": para.get("text", ""),
-            "trans_auto": "",
-            "trans_text": para.get("text", ""),
-            "trans_status": "none",
-            "block_tag": "p",
-            "parent_id": 0,
-            "modified_at": now,
-            "comments": []
-        })
-
-    ## スタイル辞書をソートして出力
-    style_dict = {k: v for k, v in sorted(style_dict.items(), key=lambda x: x[0])}
-
-    return {"head_styles": style_dict, "paragraphs": output_paragraphs}
+    if current_paragraph["last_char"]:
+        closed, current_paragraph = close_paragraph()
+        yield closed
 
 ## テスト用コード
 if __name__ == "__main__":
@@ -0,0 +1,227 @@
+"""
+翻訳APIの呼び出しを流量制御する。
+
+・文字数のトークンバケットで、1秒あたりに送る文字数を上限以下に保つ。
+・同時に送るリクエスト数を 429（Too Many Requests）に応じて増減させる。
+  429 を受けたら半分に減らして Retry-After の間止め、成功が続けば1つずつ戻す。
+・翻訳サービスごとの送信文字数を JSON ファイルに記録し、実行をまたいで積算する。
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+load_dotenv()
+# 送信文字数の記録ファイル（.env の TRANSLATION_USAGE_PATH で変更できる）
+DEFAULT_USAGE_PATH = os.getenv("TRANSLATION_USAGE_PATH", os.path.join("data", "translation_usage.json"))
+# 429 を受けたときに再試行する回数
+MAX_RATE_LIMIT_RETRIES = 8
+# Retry-After が無い 429 の待ち時間（1, 2, 4, ... 秒、最大 60 秒）
+RATE_LIMIT_BACKOFF_SECONDS = 1.0
+RATE_LIMIT_BACKOFF_MAX = 60.0
+# 429 を受けた同時実行数へ戻す前に求める成功回数の倍率
+PROBE_SUCCESSES = 10
+# トークンバケットに貯められる量（何秒分の文字数か）。分単位の割り当てを瞬間的に使い切らないよう小さくする
+BURST_SECONDS = 0.1
+
+
+class RateLimitError(Exception):
+    """
+    翻訳サービスが 429 を返したことを表す。retry_after は秒数（指定が無ければ None）。
+    """
+
+    def __init__(self, message="", retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    1秒あたり rate 文字まで送れるトークンバケット。貯められるのは capacity 文字まで。
+    1回で capacity を超える文字数も、その分だけ後の呼び出しを待たせることで受け付ける。
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate * BURST_SECONDS)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount):
+        """
+        amount 文字分を予約し、送ってよい時刻まで待つ。
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class AdaptiveGate:
+    """
+    同時に実行するリクエスト数を制限する。
+    上限は 429 で半分になり、成功が続くと1ずつ戻る。429 を受けた数（ceiling）まで戻すときは、
+    PROBE_SUCCESSES 倍の成功を待ってから試す。
+    """
+
+    def __init__(self, max_limit):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.ceiling = None
+        self._active = 0
+        self._successes = 0
+        self._consecutive_limits = 0
+        self._paused_until = 0.0
+        # 上限を減らすたびに進める。減らす前に送ったリクエストの 429 で重ねて減らさないため
+        self._generation = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """
+        実行枠を1つ確保し、世代番号を返す（rate_limited() に渡す）。
+        """
+        with self._cond:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0 and self._active < self.limit:
+                    self._active += 1
+                    return self._generation
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, succeeded):
+        with self._cond:
+            self._active -= 1
+            if succeeded:
+                self._consecutive_limits = 0
+                self._successes += 1
+                # 今の上限と同じ回数だけ続けて成功したら1つ増やす
+                required = self.limit
+                if self.ceiling is not None and self.limit + 1 >= self.ceiling:
+                    required *= PROBE_SUCCESSES
+                if self._successes >= required and self.limit < self.max_limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+    def rate_limited(self, generation, retry_after=None):
+        """
+        429 を受けたときに呼ぶ。上限を半分にし、待ち時間のあいだ新しいリクエストを止める。
+        戻り値: 待ち時間（秒）
+        """
+        with self._cond:
+            if generation == self._generation:
+                # 実際に動いている数が上限より少ない場合は、その数を基準に減らす
+                self.ceiling = min(self.limit, self._active)
+                self.limit = max(1, self.ceiling // 2)
+                self._successes = 0
+                self._generation += 1
+            if retry_after is None:
+                retry_after = min(
+                    RATE_LIMIT_BACKOFF_MAX,
+                    RATE_LIMIT_BACKOFF_SECONDS * (2 ** self._consecutive_limits),
+                )
+            self._consecutive_limits += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            self._cond.notify_all()
+            return retry_after
+
+
+class UsageCounter:
+    """
+    翻訳サービスごとの送信文字数とリクエスト数を JSON ファイルに積算する。
+    """
+
+    def __init__(self, path=DEFAULT_USAGE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Warning: {path} を読み込めません: {e}")
+
+    def add(self, backend, chars):
+        month = datetime.now().strftime("%Y-%m")
+        with self._lock:
+            usage = self._data.setdefault(backend, {"chars": 0, "requests": 0, "rate_limited": 0, "months": {}})
+            usage["chars"] += chars
+            usage["requests"] += 1
+            usage["months"][month] = usage["months"].get(month, 0) + chars
+            self._save()
+
+    def add_rate_limited(self, backend):
+        with self._lock:
+            usage = self._data.setdefault(backend, {"chars": 0, "requests": 0, "rate_limited": 0, "months": {}})
+            usage["rate_limited"] += 1
+            self._save()
+
+    def _save(self):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self):
+        with self._lock:
+            return json.loads(json.dumps(self._data))
+
+
+class Throttle:
+    """
+    1つの翻訳サービスへの呼び出しをまとめて流量制御する。
+    """
+
+    def __init__(self, backend, chars_per_second, max_concurrency, usage=None):
+        self.backend = backend
+        self.bucket = TokenBucket(chars_per_second)
+        self.gate = AdaptiveGate(max_concurrency)
+        self.usage = usage
+
+    def call(self, chars, func, *args, **kwargs):
+        """
+        chars 文字を送る func(*args, **kwargs) を、文字数とリクエスト数の上限に収めて実行する。
+        func が RateLimitError を送出した場合は、同時実行数を減らして待ってから再試行する。
+        """
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            self.bucket.acquire(chars)
+            generation = self.gate.acquire()
+            succeeded = False
+            try:
+                result = func(*args, **kwargs)
+                succeeded = True
+            except RateLimitError as e:
+                wait = self.gate.rate_limited(generation, e.retry_after)
+                if self.usage is not None:
+                    self.usage.add_rate_limited(self.backend)
+                if attempt == MAX_RATE_LIMIT_RETRIES:
+                    raise
+                print(f"Warning: {self.backend} の流量制限に達しました。同時実行数を {self.gate.limit} にして {wait:.1f}秒後に再試行します。")
+                continue
+            finally:
+                self.gate.release(succeeded)
+            if self.usage is not None:
+                self.usage.add(self.backend, chars)
+            return result
+
+    def get_stats(self):
+        return {
+            "backend": self.backend,
+            "chars_per_second": self.bucket.rate,
+            "concurrency_limit": self.gate.limit,
+            "max_concurrency": self.gate.max_limit,
+        }
@@ -1,22 +1,83 @@
 import os
 from dotenv import load_dotenv
 
+from api_throttle import Throttle, UsageCounter, RateLimitError
+
 # .env ファイルの内容を読み込む
 load_dotenv()
 TRANSLATOR = os.getenv("TRANSLATOR", "google").lower()
 
 if TRANSLATOR == "deepl":
     from api_translate_deepl import translate_text as translate_text_env
+    from api_translate_deepl import translate_texts as translate_texts_env
     print("Using DeepL translator.")
 else:
     from api_translate_google import translate_text as translate_text_env
+    from api_translate_google import translate_texts as translate_texts_env
     print("Using Google translator.")
 
+# 翻訳サービスごとの1リクエストの上限（送信するテキストで測る）
+# ・google: v2 は1リクエスト128セグメントまで、推奨は5000文字以内
+# ・deepl: リクエスト本体は128KiBまで、テキストは50件まで。文字数の上限は無いが、
+#          1リクエストの待ち時間と失敗時の損失を抑えるため30000文字で区切る
+BATCH_LIMITS = {
+    "google": {"max_chars": 5000, "max_bytes": 100 * 1024, "max_segments": 128},
+    "deepl": {"max_chars": 30000, "max_bytes": 120 * 1024, "max_segments": 50},
+}
+
+# 翻訳サービスごとの流量の上限
+# ・chars_per_second: 1秒あたりに送る文字数（google は既定の割り当て 600万文字/分）
+# ・max_concurrency: 同時に送るリクエスト数。429 を受けると自動で減らし、成功が続けば戻す
+# .env の TRANS_CHARS_PER_MINUTE で文字数の上限を変更できる（契約の割り当てに合わせる）
+THROTTLE_LIMITS = {
+    "google": {"chars_per_second": 100000, "max_concurrency": 16},
+    "deepl": {"chars_per_second": 20000, "max_concurrency": 8},
+}
+
+def get_throttle_limits(backend=None):
+    """
+    翻訳サービスの流量の上限を返す。省略時は環境変数で選ばれた翻訳サービス。
+    """
+    limits = dict(THROTTLE_LIMITS.get(backend or TRANSLATOR, THROTTLE_LIMITS["google"]))
+    chars_per_minute = os.getenv("TRANS_CHARS_PER_MINUTE")
+    if chars_per_minute:
+        limits["chars_per_second"] = float(chars_per_minute) / 60
+    return limits
+
+# 翻訳APIの呼び出しはすべてこのスロットルを通す
+# （paraparatrans_json_file・dict_trans・/api/translate で共有する）
+usage_counter = UsageCounter()
+throttle = Throttle(TRANSLATOR, usage=usage_counter, **get_throttle_limits())
+
+def get_batch_limits(backend=None):
+    """
+    翻訳サービスの1リクエストの上限を返す。省略時は環境変数で選ばれた翻訳サービス。
+    不明なサービス（テスト用の翻訳関数など）には google の上限を使う。
+    """
+    return BATCH_LIMITS.get(backend or TRANSLATOR, BATCH_LIMITS["google"])
+
 def translate_text(text, source="EN", target="JA"):
     """
     環境変数の設定に応じた翻訳サービスでテキストを翻訳します。
+    流量の上限を超えないよう、必要なら送信を待ちます。
+    """
+    return throttle.call(len(text), translate_text_env, text, source, target)
+
+def translate_texts(texts, source="EN", target="JA"):
+    """
+    テキストのリストを1リクエストで翻訳し、同じ順番の訳文のリストを返します。
+    件数や大きさは get_batch_limits() の上限に収めて呼び出してください。
+    """
+    if not texts:
+        return []
+    chars = sum(len(text) for text in texts)
+    return throttle.call(chars, translate_texts_env, texts, source, target)
+
+def get_usage_stats():
+    """
+    翻訳サービスごとの送信文字数（累計と月別）と、現在の流量制御の状態を返します。
     """
-    return translate_text_env(text, source, target)
+    return {"usage": usage_counter.get(), "throttle": throttle.get_stats()}
 
 if __name__ == "__main__":
     html_text = "<p>Hello <strong>ParaParaTrans</strong>!</p>"
@@ -2,6 +2,8 @@ import os
 import deepl
 from dotenv import load_dotenv
 
+from api_throttle import RateLimitError
+
 # DeepL の認証キーを.envファイルから取得
 load_dotenv()
 DEEPL_AUTH_KEY = os.getenv("DEEPL_AUTH_KEY")
@@ -12,6 +14,16 @@ if not DEEPL_AUTH_KEY:
 
 translator = deepl.Translator(DEEPL_AUTH_KEY)
 
+def call_deepl(texts, **options):
+    """
+    DeepL の translate_text を呼ぶ。429 は RateLimitError に変換し、
+    同時実行数の調整と再試行を呼び出し元（api_throttle）に任せる。
+    """
+    try:
+        return translator.translate_text(texts, **options)
+    except deepl.TooManyRequestsException as e:
+        raise RateLimitError(str(e)) from e
+
 def translate_text(text, source="EN", target="JA"):
     """
     HTMLタグを保持しつつテキストを翻訳する (DeepL バージョン)
@@ -21,7 +33,7 @@ def translate_text(text, source="EN", target="JA"):
     # DeepL APIに送信する前に置換
     text = text.replace("【", "<p>").replace("】", "</p>")
 
-    result = translator.translate_text(
+    result = call_deepl(
         text,
         source_lang=source,
         target_lang=target,
@@ -34,6 +46,19 @@ def translate_text(text, source="EN", target="JA"):
 
     return result
 
+def translate_texts(texts, source="EN", target="JA"):
+    """
+    テキストのリストを1リクエストで翻訳し、同じ順番の訳文のリストを返す (DeepL バージョン)
+    テキストごとに訳文が返るので、【】で区切って連結する必要はない。
+    """
+    results = call_deepl(
+        texts,
+        source_lang=source,
+        target_lang=target,
+        tag_handling="html"
+    )
+    return [r.text for r in results]
+
 if __name__ == "__main__":
     html_text = "deepl:<p>Hello <strong>ParaParaTrans</strong>!</p>"
     translated_text = translate_text(html_text)
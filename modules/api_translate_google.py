@@ -1,26 +1,122 @@
 import os
+import random
+import threading
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
+from api_throttle import RateLimitError
+
 # google のAPIキーを.envファイルから取得
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
+# 接続先（テスト用のスタブサーバに向ける場合は .env の GOOGLE_TRANSLATE_URL で変更する）
+GOOGLE_TRANSLATE_URL = os.getenv("GOOGLE_TRANSLATE_URL", "https://translation.googleapis.com/language/translate/v2")
+# (接続, 応答待ち) のタイムアウト秒数
+GOOGLE_TIMEOUT = (
+    float(os.getenv("GOOGLE_CONNECT_TIMEOUT", "5")),
+    float(os.getenv("GOOGLE_READ_TIMEOUT", "60")),
+)
+# 5xx や通信エラーのときに再試行する回数と、待ち時間の基準秒数（1, 2, 4, ... 倍に延ばす）
+GOOGLE_MAX_RETRIES = int(os.getenv("GOOGLE_MAX_RETRIES", "4"))
+GOOGLE_BACKOFF_SECONDS = float(os.getenv("GOOGLE_BACKOFF_SECONDS", "0.5"))
+# 再試行するHTTPステータス（429 は api_throttle で同時実行数を減らしてから再試行する）
+RETRY_STATUS = {500, 502, 503, 504}
+# コネクションプールの大きさ（同時に翻訳するスレッド数以上にする）
+POOL_SIZE = 16
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """
+    接続を使い回す（keep-alive）共有の requests.Session を返す。
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"Accept-Encoding": "gzip"})
+            _session = session
+        return _session
+
+def retry_after_seconds(response):
+    """
+    Retry-After ヘッダの秒数を返す。無ければ None。
+    """
+    retry_after = response.headers.get("Retry-After")
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return None
+
+def backoff_seconds(attempt, response=None):
+    """
+    再試行までの待ち時間。Retry-After があればそれに従い、なければ指数的に延ばして揺らぎを加える。
+    """
+    if response is not None:
+        retry_after = retry_after_seconds(response)
+        if retry_after is not None:
+            return retry_after
+    return GOOGLE_BACKOFF_SECONDS * (2 ** attempt) * (0.5 + random.random())
+
+def post_translate(params):
+    """
+    翻訳APIにPOSTで送り、translations のリストを返す。
+    長いテキストでもURLの長さ制限を受けないよう、パラメータはリクエスト本体に入れる。
+    5xx と通信エラーは GOOGLE_MAX_RETRIES 回まで待ってから再試行する。
+    429 は RateLimitError として送出し、再試行は呼び出し元（api_throttle）に任せる。
+    """
+    session = get_session()
+    for attempt in range(GOOGLE_MAX_RETRIES + 1):
+        try:
+            response = session.post(GOOGLE_TRANSLATE_URL, data=params, timeout=GOOGLE_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == GOOGLE_MAX_RETRIES:
+                raise
+            wait = backoff_seconds(attempt)
+            print(f"Warning: 翻訳APIに接続できません（{e}）。{wait:.1f}秒後に再試行します。")
+            time.sleep(wait)
+            continue
+        if response.status_code == 200:
+            return response.json()['data']['translations']
+        if response.status_code == 429:
+            raise RateLimitError(f"Error: 429, {response.text}", retry_after_seconds(response))
+        if response.status_code in RETRY_STATUS and attempt < GOOGLE_MAX_RETRIES:
+            wait = backoff_seconds(attempt, response)
+            print(f"Warning: 翻訳APIが {response.status_code} を返しました。{wait:.1f}秒後に再試行します。")
+            time.sleep(wait)
+            continue
+        raise Exception(f"Error: {response.status_code}, {response.text}")
+
 def translate_text(text, source="en", target="ja"):
-    url = "https://translation.googleapis.com/language/translate/v2"
     params = {
         'q': text,
         'source': source,
         'target': target,
         'key': GOOGLE_API_KEY
     }
-    response = requests.get(url, params=params)
-    if response.status_code == 200:
-        return response.json()['data']['translations'][0]['translatedText']
-    else:
-        raise Exception(f"Error: {response.status_code}, {response.text}")
+    return post_translate(params)[0]['translatedText']
+
+def translate_texts(texts, source="en", target="ja"):
+    """
+    テキストのリストを q パラメータの繰り返しで1リクエストにまとめて翻訳し、
+    同じ順番の訳文のリストを返す。
+    """
+    params = [('q', text) for text in texts] + [
+        ('source', source),
+        ('target', target),
+        ('key', GOOGLE_API_KEY)
+    ]
+    translations = post_translate(params)
+    return [t['translatedText'] for t in translations]
 
 if __name__ == '__main__':
     html_text = "deepl:<p>Hello <strong>ParaParaTrans</strong>!</p>"
     translated_text = translate_text(html_text)
-    print(translated_text)
\ No newline at end of file
+    print(translated_text)
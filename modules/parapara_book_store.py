@@ -0,0 +1,272 @@
+"""
+Flask サーバ用の book_data（parapara形式JSON）のメモリキャッシュ。
+
+・JSON はファイルごとに1回だけ読み込み、以降はメモリ上の dict を返す。
+・ファイルの更新（mtime とサイズ）を確認し、外部で書き換えられていれば読み直す。
+・変更は dirty として記録し、一定時間まとめてからバックグラウンドで書き出す。
+・書き出しに失敗した場合は間隔を延ばしながら再試行し、エラーを save_error() で返す。
+・プロセス終了時には未保存の変更をすべて書き出す。
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 最後の変更からファイルへ書き出すまでの待ち時間（秒）
+FLUSH_DELAY = 1.0
+# 書き出しに失敗した場合の再試行の間隔の上限（秒）。間隔は flush_delay から失敗するたびに倍にする
+FLUSH_RETRY_MAX = 60.0
+
+
+def file_signature(json_path):
+    """
+    ファイルの更新を判定するための (mtime, サイズ) を返す。存在しない場合は None。
+    """
+    try:
+        st = os.stat(json_path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class BookStore:
+    """
+    JSON ファイルのパスをキーに book_data を保持する。
+    返した dict を変更する場合は edit() の中で行い、dirty を記録させること。
+    """
+
+    def __init__(self, flush_delay=FLUSH_DELAY, retry_max=FLUSH_RETRY_MAX):
+        self.flush_delay = flush_delay
+        self.retry_max = retry_max
+        self._lock = threading.RLock()
+        # 同じファイルへの書き出しが前後しないよう、書き出しは1つずつ行う
+        self._flush_lock = threading.Lock()
+        # json_path -> {"data", "signature", "dirty", "version", "timer", "flush_error", "retry_delay", "index", ...}
+        self._entries = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "flush_seconds_total": 0.0,
+            "flush_seconds_max": 0.0,
+            "flush_seconds_last": 0.0,
+        }
+
+    def get(self, json_path):
+        """
+        book_data を返す。キャッシュが無いか、ファイルが外部で更新されていれば読み込む。
+        ファイルが存在しない場合は FileNotFoundError。
+        """
+        with self._lock:
+            entry = self._entries.get(json_path)
+            signature = file_signature(json_path)
+            if entry is not None:
+                if entry["dirty"] or signature == entry["signature"]:
+                    if entry["dirty"] and signature != entry["signature"]:
+                        # 書き出し前に外部で更新された場合は、利用者の編集を優先する
+                        print(f"警告: {json_path} は外部で更新されましたが、未保存の変更を優先します。")
+                    self._stats["hits"] += 1
+                    return entry["data"]
+            if signature is None:
+                self._entries.pop(json_path, None)
+                raise FileNotFoundError(json_path)
+
+            self._stats["misses"] += 1
+            with open(json_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._entries[json_path] = {
+                "data": data,
+                "signature": signature,
+                "dirty": False,
+                "version": 0,
+                "timer": None,
+                "flush_error": None,
+                "retry_delay": 0.0,
+                "index": None,
+                "indexed_list": None,
+                "indexed_count": 0,
+            }
+            return data
+
+    def paragraph_index(self, json_path):
+        """
+        str(id) -> 段落 の dict を返す。id が重複する場合は先頭の段落を指す。
+        paragraphs のリストが差し替えられるか件数が変わった場合だけ作り直す。
+        段落の id を書き換えた場合は reindex() を呼ぶこと。
+        """
+        with self._lock:
+            data = self.get(json_path)
+            entry = self._entries[json_path]
+            paragraphs = data.get("paragraphs", [])
+            index = entry["index"]
+            if index is None or entry["indexed_list"] is not paragraphs or entry["indexed_count"] != len(paragraphs):
+                index = {}
+                for p in paragraphs:
+                    index.setdefault(str(p.get("id")), p)
+                entry["index"] = index
+                entry["indexed_list"] = paragraphs
+                entry["indexed_count"] = len(paragraphs)
+            return index
+
+    def reindex(self, json_path):
+        """
+        段落の索引を破棄し、次の paragraph_index() で作り直させる。
+        """
+        with self._lock:
+            entry = self._entries.get(json_path)
+            if entry is not None:
+                entry["index"] = None
+
+    @contextmanager
+    def locked(self, json_path):
+        """
+        ストアのロックを保持したまま book_data を渡すコンテキストマネージャ。
+        検証してから変更する場合に使い、変更したときは mark_dirty() を呼ぶ。
+        """
+        with self._lock:
+            yield self.get(json_path)
+
+    @contextmanager
+    def edit(self, json_path):
+        """
+        book_data を変更するためのコンテキストマネージャ。
+        ブロックを抜けると dirty を記録し、遅延書き出しを予約する。
+        """
+        with self._lock:
+            data = self.get(json_path)
+            yield data
+            self.mark_dirty(json_path)
+
+    def mark_dirty(self, json_path):
+        """
+        変更を記録し、flush_delay 秒後に書き出す。続けて変更があれば書き出しを延期する。
+        book_data の "version" を1つ進める（クライアントの楽観的排他に使う）。
+        """
+        with self._lock:
+            entry = self._entries[json_path]
+            entry["data"]["version"] = entry["data"].get("version", 0) + 1
+            entry["dirty"] = True
+            entry["version"] += 1
+            if entry["timer"] is not None:
+                entry["timer"].cancel()
+            timer = threading.Timer(self.flush_delay, self.flush, args=(json_path,))
+            timer.daemon = True
+            entry["timer"] = timer
+            timer.start()
+
+    def flush(self, json_path):
+        """
+        未保存の変更があればファイルへ書き出す。
+        """
+        with self._flush_lock:
+            with self._lock:
+                entry = self._entries.get(json_path)
+                if entry is None or not entry["dirty"]:
+                    return
+                if entry["timer"] is not None:
+                    entry["timer"].cancel()
+                    entry["timer"] = None
+                version = entry["version"]
+                # 書き出し中の変更と競合しないよう、ロック内で文字列にしておく
+                start = time.perf_counter()
+                text = json.dumps(entry["data"], ensure_ascii=False, indent=2)
+
+            try:
+                tmp_path = json_path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(text)
+                os.replace(tmp_path, json_path)
+            except OSError as e:
+                with self._lock:
+                    self._stats["flush_errors"] += 1
+                    entry["flush_error"] = str(e)
+                    entry["retry_delay"] = min(max(entry["retry_delay"] * 2, self.flush_delay), self.retry_max)
+                    print(f"Error: {json_path} の保存に失敗しました（{entry['retry_delay']:g} 秒後に再試行します）: {e}")
+                    # 書き出し中の変更で書き出しが予約されていなければ、再試行を予約する
+                    if entry["timer"] is None and self._entries.get(json_path) is entry:
+                        timer = threading.Timer(entry["retry_delay"], self.flush, args=(json_path,))
+                        timer.daemon = True
+                        entry["timer"] = timer
+                        timer.start()
+                return
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                entry["signature"] = file_signature(json_path)
+                entry["flush_error"] = None
+                entry["retry_delay"] = 0.0
+                # 書き出し中に変更が無ければ保存済みとする
+                if entry["version"] == version:
+                    entry["dirty"] = False
+                self._stats["flushes"] += 1
+                self._stats["flush_seconds_total"] += elapsed
+                self._stats["flush_seconds_last"] = elapsed
+                self._stats["flush_seconds_max"] = max(self._stats["flush_seconds_max"], elapsed)
+
+    def save_error(self, json_path):
+        """
+        直前の書き出しに失敗していればエラーメッセージを返す（再試行で保存できれば None に戻る）。
+        """
+        with self._lock:
+            entry = self._entries.get(json_path)
+            return entry["flush_error"] if entry is not None else None
+
+    def flush_all(self):
+        """
+        すべての未保存の変更を書き出す。
+        """
+        with self._lock:
+            paths = [path for path, entry in self._entries.items() if entry["dirty"]]
+        for json_path in paths:
+            self.flush(json_path)
+
+    def invalidate(self, json_path):
+        """
+        未保存の変更を書き出してからキャッシュを破棄する。次の get() でファイルから読み直す。
+        """
+        self.flush(json_path)
+        with self._lock:
+            entry = self._entries.pop(json_path, None)
+            if entry is not None and entry["timer"] is not None:
+                entry["timer"].cancel()
+
+    @contextmanager
+    def external_update(self, json_path):
+        """
+        ファイルを直接読み書きする処理を囲む。
+        開始前に未保存の変更を書き出し、終了後にキャッシュを破棄する。
+        ファイルが書き換えられていれば、読み直して version を進める。
+        """
+        self.flush(json_path)
+        signature = file_signature(json_path)
+        try:
+            yield
+        finally:
+            self.invalidate(json_path)
+            if file_signature(json_path) not in (None, signature):
+                with self.edit(json_path):
+                    pass
+
+    def get_stats(self):
+        """
+        ヒット/ミス数、書き出し回数と所要時間、キャッシュ中の冊数を返す。
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cached_books"] = len(self._entries)
+            stats["dirty_books"] = sum(1 for e in self._entries.values() if e["dirty"])
+            stats["failing_books"] = sorted(path for path, e in self._entries.items() if e["flush_error"])
+        if stats["flushes"]:
+            stats["flush_seconds_avg"] = stats["flush_seconds_total"] / stats["flushes"]
+        else:
+            stats["flush_seconds_avg"] = 0.0
+        return stats
+
+
+# サーバ全体で共有するインスタンス。終了時に未保存の変更を書き出す
+book_store = BookStore()
+atexit.register(book_store.flush_all)
@@ -2,8 +2,12 @@
 import json
 import re
 import sys
-import csv
 import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from parapara_dict_file import load_table, write_tsv
+from parapara_dict_occurrences import get_occurrence_index, source_hash
 
 def extract_phrases(text):
     """
@@ -17,7 +21,106 @@ def extract_phrases(text):
     )
     return pattern.findall(text)
 
-def dict_create(input_filename, output_filename="dict.txt"):
+def extract_keys(text):
+    """
+    テキストから辞書のキーにする語句を抽出し、語句 -> 出現回数 を返す。
+    """
+    counts = Counter()
+    for phrase in extract_phrases(text):
+        cleaned = clean_key(phrase.strip())
+        if cleaned:
+            counts[cleaned] += 1
+    return counts
+
+def read_dictionary(dict_filename):
+    """
+    dictファイルを読み込み、キー -> (訳語, 状態, 出現回数) を返す（存在しなければ空の辞書）。
+    """
+    existing_dict = {}
+    if os.path.exists(dict_filename):
+        try:
+            # 解析済みの列を使う（dict.txt が変わっていなければ TSV を解析し直さない）
+            table = load_table(dict_filename)
+            rows = zip(table.nfields, table.keys, table.values, table.states, table.counts)
+            # ヘッダ行（と先頭の空行）はスキップ
+            if len(table) and (table.nfields[0] == 0 or table.keys[0].startswith("#英語")):
+                next(rows)
+            for n, key, value, state, count in rows:
+                if n < 2:
+                    raise ValueError(f"列が足りません: {key!r}")
+                if n == 2:
+                    state = "0"
+                    count = 0
+                elif n == 3:
+                    count = 0
+                else:
+                    count = int(count)
+                existing_dict[key] = (value, state, count)
+        except Exception as e:
+            print(f"Error reading {dict_filename}: {e}")
+            sys.exit(1)
+    return existing_dict
+
+def write_dictionary(existing_dict, dict_filename):
+    """
+    文字数降順、同じ文字数の場合はアルファベット昇順でソートして書き出す。
+    一時ファイルに書いてから置き換えるので、途中で失敗しても元のファイルは壊れない。
+    """
+    sorted_keys = sorted(existing_dict.keys(), key=lambda s: (-len(s), s))
+    # ヘッダ行を追加
+    rows = [["#英語", "#日本語", "#状態", "#出現回数"]]
+    rows.extend([key, *existing_dict[key]] for key in sorted_keys)
+    write_tsv(dict_filename, rows)
+
+def merge_counts(existing_dict, previous_counts, new_counts):
+    """
+    前回数えた出現回数（previous_counts）から今回の出現回数（new_counts）への増減を existing_dict に加える。
+    辞書に無い語句は状態9で追加する。
+    """
+    for phrase, count in new_counts.items():
+        delta = count - previous_counts.get(phrase, 0)
+        if phrase in existing_dict:
+            value, state, existing_count = existing_dict[phrase]
+            existing_dict[phrase] = (value, state, max(0, existing_count + delta))
+        else:
+            existing_dict[phrase] = (phrase, "9", count)
+    # 無くなった語句は、前回数えた分を減らす
+    for phrase, count in previous_counts.items():
+        if phrase not in new_counts and phrase in existing_dict:
+            value, state, existing_count = existing_dict[phrase]
+            existing_dict[phrase] = (value, state, max(0, existing_count - count))
+
+def scan_book(input_filename, known_hashes, progress=None):
+    """
+    本のJSONを読み、known_hashes（段落id -> 前回の原文のハッシュ）から原文が変わった段落の語句を抽出する。
+    ワーカープロセスからも呼ぶ（出現箇所の索引には触れない）。
+    戻り値: (段落id -> (原文のハッシュ, {語句: 出現回数}), 無くなった段落idのリスト, 段落数)
+            段落を持たないJSONの場合は None
+    """
+    with open(input_filename, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or not isinstance(data.get("paragraphs"), list):
+        return None
+
+    paragraphs = data["paragraphs"]
+    changed = {}
+    paragraph_ids = set()
+    for i, p in enumerate(paragraphs, 1):
+        paragraph_id = str(p.get("id"))
+        paragraph_ids.add(paragraph_id)
+        src_hash = source_hash(p.get("src_text", ""))
+        if known_hashes.get(paragraph_id) != src_hash:
+            changed[paragraph_id] = (src_hash, extract_keys(p.get("src_text", "")))
+        if progress is not None:
+            progress(i, len(paragraphs))
+    removed_ids = [pid for pid in known_hashes if pid not in paragraph_ids]
+    return changed, removed_ids, len(paragraphs)
+
+def file_signature(filename):
+    st = os.stat(filename)
+    return st.st_mtime_ns, st.st_size
+
+def dict_create(input_filename, output_filename="dict.txt", progress=None, occurrence_index=None):
     """
     JSONファイル(input_filename)から段落の src_text を読み取り、
     条件に沿った語句を抽出して重複を除去、既存のdictファイルをマージして
@@ -30,89 +133,132 @@ def dict_create(input_filename, output_filename="dict.txt"):
       9: 抽出
       
     既存のdictファイルが2列の場合、状態は0とみなす。
+    progress: 指定すると、段落を1つ処理するごとに progress(処理済み段落数, 段落数) を呼ぶ。
+
+    語句の出現箇所は出現箇所の索引（occurrence_index、省略時は共有の索引）に段落ごとに記録する。
+    前回の辞書抽出から原文が変わっていない段落は解析し直さない。
+    出現回数には、この本での出現回数の前回からの増減を加える（同じ本を何度抽出しても二重に数えない）。
     """
+    if occurrence_index is None:
+        occurrence_index = get_occurrence_index()
+
     # 既存のdictファイルを読み込む（存在しなければ空の辞書）
-    existing_dict = {}
-    if os.path.exists(output_filename):
-        try:
-            with open(output_filename, "r", encoding="utf-8", newline='') as f:
-                reader = csv.reader(f, delimiter='\t')
-                # ヘッダ行の有無をチェック
-                first_row = next(reader, None)
-                if first_row and first_row[0].startswith("#英語"):
-                    # ヘッダ行がある場合はスキップ
-                    pass
-                else:
-                    # ヘッダ行がない場合は最初の行を処理
-                    if first_row:
-                        reader = [first_row] + list(reader)
-                for row in reader:
-                    if len(row) == 2:
-                        key, value = row
-                        state = "0"
-                        count = 0
-                    elif len(row) == 3:
-                        key, value, state = row
-                        count = 0
-                    else:
-                        key, value, state, count = row[0], row[1], row[2], int(row[3])
-                    existing_dict[key] = (value, state, count)
-        except Exception as e:
-            print(f"Error reading {output_filename}: {e}")
-            sys.exit(1)
+    existing_dict = read_dictionary(output_filename)
 
+    book = os.path.basename(input_filename)
     try:
-        with open(input_filename, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        signature = file_signature(input_filename)
+        scanned = scan_book(input_filename, occurrence_index.paragraph_hashes(book), progress)
     except Exception as e:
         print(f"Error reading {input_filename}: {e}")
         sys.exit(1)
+    if scanned is None:
+        print(f"Error reading {input_filename}: 段落がありません")
+        sys.exit(1)
+    changed, removed_ids, paragraph_count = scanned
 
-    phrase_set = set()
-    paragraphs = data.get("paragraphs", [])
-    for p in paragraphs:
-        src_text = p.get("src_text", "")
-        extracted = extract_phrases(src_text)
-        for phrase in extracted:
-            phrase = phrase.strip()
-            cleaned = clean_key(phrase)
-            if cleaned:
-                phrase_set.add(cleaned)
-                if cleaned in existing_dict:
-                    value, state, count = existing_dict[cleaned]
-                    existing_dict[cleaned] = (value, state, count + 1)
-                else:
-                    existing_dict[cleaned] = (cleaned, "9", 1)
-
-    # 既存のエントリを優先するための存在チェック（状態により判定）
-    def exists_in_existing(new_key):
-        for exist_key, (value, state, count) in existing_dict.items():
-            if state == "0":
-                if new_key.lower() == exist_key.lower():
-                    return True
-            elif state == "1":
-                if new_key == exist_key:
-                    return True
-            else:  # state 8, 9 等の場合は完全一致で判断
-                if new_key == exist_key:
-                    return True
-        return False
-
-    # 新規抽出エントリ（状態9）のマージ
-    for key in phrase_set:
-        if not exists_in_existing(key):
-            existing_dict[key] = (key, "9", 1)
-
-    # 文字数降順、同じ文字数の場合はアルファベット昇順でソート
-    sorted_keys = sorted(existing_dict.keys(), key=lambda s: (-len(s), s))
+    # 索引の更新は dictファイルを書き出してから確定する
+    try:
+        previous_counts = occurrence_index.book_counts(book)
+        occurrence_index.update_book(book, changed, removed_ids, signature, commit=False)
+        book_counts = occurrence_index.book_counts(book)
+        merge_counts(existing_dict, previous_counts, book_counts)
+        write_dictionary(existing_dict, output_filename)
+        occurrence_index.commit()
+    except BaseException:
+        occurrence_index.rollback()
+        raise
+    print(f"辞書抽出: 段落 {paragraph_count} 件のうち {len(changed)} 件を解析しました（削除 {len(removed_ids)} 件）")
+
+def dict_create_corpus(folder, output_filename="dict.txt", workers=None, progress=None, occurrence_index=None):
+    """
+    folder 内のすべての本のJSONから語句を抽出し、dictファイルに1回でマージする（dict_create の全書籍版）。
+    ・前回の辞書抽出から JSON の更新日時とサイズが変わっていない本は読まない。
+    ・変わった本はワーカープロセス（workers 個、省略時はCPU数）で並列に解析し、語句ごとの出現回数の増減を合計する。
+    ・folder から無くなった本は索引から削除し、その本で数えた出現回数を減らす。
+    ・索引の更新は dictファイルを書き出してから確定する。途中で失敗した場合はどちらも変更しない。
+    progress: 指定すると、本を1冊処理するごとに progress(処理済み冊数, 冊数) を呼ぶ。
+    戻り値: {"books": 本の冊数, "scanned": 解析した冊数, "skipped": 変更が無く読まなかった冊数,
+             "removed": 索引から削除した冊数, "paragraphs": 解析した段落数}
+    """
+    if occurrence_index is None:
+        occurrence_index = get_occurrence_index()
+    existing_dict = read_dictionary(output_filename)
+
+    signatures = occurrence_index.book_signatures()
+    books = {}
+    for fname in sorted(os.listdir(folder)):
+        path = os.path.join(folder, fname)
+        if fname.lower().endswith(".json") and os.path.isfile(path):
+            books[fname] = (path, file_signature(path))
+    targets = [book for book, (path, signature) in books.items() if signatures.get(book) != tuple(signature)]
+    removed_books = [book for book in signatures if book not in books]
+
+    if workers is None or workers < 1:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(targets)))
+
+    previous_counts = Counter()
+    new_counts = Counter()
+    scanned_paragraphs = 0
+    done = 0
+
+    def reduce(book, scanned):
+        nonlocal scanned_paragraphs, done
+        path, signature = books[book]
+        if scanned is not None:
+            changed, removed_ids, paragraph_count = scanned
+            previous_counts.update(occurrence_index.book_counts(book))
+            occurrence_index.update_book(book, changed, removed_ids, signature, commit=False)
+            new_counts.update(occurrence_index.book_counts(book))
+            scanned_paragraphs += len(changed)
+        else:
+            # 本ではないJSON。次回も読まないように更新日時だけを記録する
+            occurrence_index.update_book(book, {}, [], signature, commit=False)
+        done += 1
+        if progress is not None:
+            progress(done, len(targets))
+
+    try:
+        if progress is not None:
+            progress(0, len(targets))
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(scan_book, books[book][0], occurrence_index.paragraph_hashes(book)): book
+                    for book in targets
+                }
+                try:
+                    for future in as_completed(futures):
+                        reduce(futures[future], future.result())
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+        else:
+            for book in targets:
+                reduce(book, scan_book(books[book][0], occurrence_index.paragraph_hashes(book)))
+
+        for book in removed_books:
+            previous_counts.update(occurrence_index.book_counts(book))
+            occurrence_index.remove_book(book, commit=False)
+
+        merge_counts(existing_dict, previous_counts, new_counts)
+        write_dictionary(existing_dict, output_filename)
+        occurrence_index.commit()
+    except BaseException:
+        occurrence_index.rollback()
+        raise
 
-    with open(output_filename, "w", encoding="utf-8", newline='') as out_file:
-        writer = csv.writer(out_file, delimiter='\t')
-        # ヘッダ行を追加
-        writer.writerow(["#英語", "#日本語", "#状態", "#出現回数"])
-        for key in sorted_keys:
-            value, state, count = existing_dict[key]
-            writer.writerow([key, value, state, count])
+    result = {
+        "books": len(books),
+        "scanned": len(targets),
+        "skipped": len(books) - len(targets),
+        "removed": len(removed_books),
+        "paragraphs": scanned_paragraphs,
+    }
+    print(f"辞書抽出（全書籍）: {result}")
+    return result
 
 def clean_key(key: str) -> str:
     """
@@ -162,12 +308,15 @@ def clean_key(key: str) -> str:
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python generate_dict.py <input_json_file> [output_csv_file]")
+        print("Usage: python generate_dict.py <input_json_file | data_folder> [output_csv_file]")
         sys.exit(1)
 
     input_filename = sys.argv[1]
     output_filename = sys.argv[2] if len(sys.argv) > 2 else "dict.txt"
-    dict_create(input_filename, output_filename)
+    if os.path.isdir(input_filename):
+        dict_create_corpus(input_filename, output_filename)
+    else:
+        dict_create(input_filename, output_filename)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,175 @@
+"""
+対訳辞書ファイル（dict.txt）の読み込み。
+
+・TSV を解析した結果を、列（列数・英語・日本語・状態・出現回数）ごとにまとめたコンパイル済みファイル
+  （dict.txt.bin）に保存し、TSV が変わるまで使い回す。pickle は使わない。
+・読み込んだ結果はメモリ上にも保持し、TSV の更新日時とサイズが変わったときだけ読み直す。
+  サーバーでは dict.txt を編集すると次の利用時に読み直される（リクエストごとには解析しない）。
+"""
+
+import csv
+import os
+import struct
+import threading
+from array import array
+
+# コンパイル済みファイルの形式
+MAGIC = b"PPDICT01"
+# MAGIC, TSV の更新日時[ns], TSV のサイズ, 行数
+HEADER = struct.Struct("<8sqqI")
+LENGTH = struct.Struct("<Q")
+# 保存する列数（英語・日本語・状態・出現回数）。それより後ろの列は使わないので保存しない
+MAX_FIELDS = 4
+SEPARATOR = "\0"
+
+
+class DictTable:
+    """
+    dict.txt の各行を列ごとに持つ。
+    nfields: 行の列数（空行は0）。その行に無い列は "" が入る。
+    """
+
+    def __init__(self, nfields, keys, values, states, counts):
+        self.nfields = nfields
+        self.keys = keys
+        self.values = values
+        self.states = states
+        self.counts = counts
+
+    def __len__(self):
+        return len(self.nfields)
+
+    def rows(self):
+        """
+        各行を、元の列数のリストで返す（csv.reader と同じ形）。
+        """
+        columns = (self.keys, self.values, self.states, self.counts)
+        for i, n in enumerate(self.nfields):
+            yield [column[i] for column in columns[:n]]
+
+    @classmethod
+    def from_rows(cls, rows):
+        nfields = array("B")
+        columns = ([], [], [], [])
+        for row in rows:
+            n = min(len(row), MAX_FIELDS)
+            nfields.append(n)
+            for i, column in enumerate(columns):
+                column.append(row[i] if i < n else "")
+        return cls(nfields, *columns)
+
+
+def compiled_path(dict_file):
+    return dict_file + ".bin"
+
+
+def file_signature(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def parse_tsv(dict_file):
+    with open(dict_file, "r", encoding="utf-8", newline="") as f:
+        return DictTable.from_rows(csv.reader(f, delimiter="\t"))
+
+
+def save_compiled(dict_file, table, signature=None):
+    """
+    table をコンパイル済みファイルに書き出す。signature は元の TSV の (更新日時[ns], サイズ)。
+    区切り文字を含むセルがある場合は書き出さない（TSV から読む）。
+    """
+    if signature is None:
+        signature = file_signature(dict_file)
+    columns = (table.keys, table.values, table.states, table.counts)
+    if any(SEPARATOR in cell for column in columns for cell in column):
+        return False
+    blobs = [table.nfields.tobytes()] + [SEPARATOR.join(column).encode("utf-8") for column in columns]
+    tmp_path = compiled_path(dict_file) + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, signature[0], signature[1], len(table)))
+            for blob in blobs:
+                f.write(LENGTH.pack(len(blob)))
+                f.write(blob)
+        os.replace(tmp_path, compiled_path(dict_file))
+    except OSError as e:
+        print(f"Warning: {compiled_path(dict_file)} を保存できません: {e}")
+        return False
+    return True
+
+
+def load_compiled(dict_file, signature):
+    """
+    コンパイル済みファイルを読む。無い場合や TSV と signature が一致しない場合は None。
+    """
+    try:
+        with open(compiled_path(dict_file), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < HEADER.size:
+        return None
+    magic, mtime_ns, size, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or (mtime_ns, size) != tuple(signature):
+        return None
+
+    offset = HEADER.size
+    blobs = []
+    for _ in range(1 + MAX_FIELDS):
+        (length,) = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        blobs.append(data[offset:offset + length])
+        offset += length
+    nfields = array("B")
+    nfields.frombytes(blobs[0])
+    # 0行の場合、列は空文字列1つに分割されるので行数で切り詰める
+    columns = [blob.decode("utf-8").split(SEPARATOR)[:count] for blob in blobs[1:]]
+    if len(nfields) != count or any(len(column) != count for column in columns):
+        return None
+    return DictTable(nfields, *columns)
+
+
+# 辞書ファイルのパス -> ((更新日時, サイズ), DictTable)
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def load_table(dict_file):
+    """
+    dict.txt を DictTable として返す。
+    TSV が変わっていなければメモリ上のもの、次にコンパイル済みファイルを使い、どちらも無ければ TSV を解析する。
+    """
+    signature = file_signature(dict_file)
+    key = os.path.abspath(dict_file)
+    with _tables_lock:
+        cached = _tables.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+    table = load_compiled(dict_file, signature)
+    if table is None:
+        table = parse_tsv(dict_file)
+        save_compiled(dict_file, table, signature)
+    with _tables_lock:
+        _tables[key] = (signature, table)
+    return table
+
+
+def write_tsv(dict_file, rows):
+    """
+    rows（列のリストのリスト）を dict.txt に書き出し、コンパイル済みファイルも作り直す。
+    一時ファイルに書いてから置き換えるので、途中で失敗しても元のファイルは壊れない。
+    """
+    rows = list(rows)
+    tmp_path = dict_file + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter="\t")
+        writer.writerows(rows)
+    os.replace(tmp_path, dict_file)
+
+    # 書いた内容から作る（読み直さない）。csv.writer が引用符で囲む値は、読み直した値と同じになる
+    table = DictTable.from_rows([[str(cell) for cell in row] for row in rows])
+    signature = file_signature(dict_file)
+    save_compiled(dict_file, table, signature)
+    with _tables_lock:
+        _tables[os.path.abspath(dict_file)] = (signature, table)
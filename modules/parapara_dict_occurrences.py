@@ -0,0 +1,182 @@
+"""
+対訳辞書の語句の出現箇所の索引。辞書抽出（dict_create）で作り、SQLite に保存する。
+
+・本ごと・段落ごとに、抽出した語句とその出現回数を記録する。
+・段落の原文のハッシュも記録し、原文が変わっていない段落は次の辞書抽出で解析し直さない。
+・本のJSONの更新日時とサイズも記録し、全書籍の辞書抽出では変わっていない本を読まない。
+・語句（大文字小文字を区別しない）から、出現する本と段落の一覧を引ける。
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+# 出現箇所の索引のファイル（.env の DICT_OCCURRENCES_PATH で変更できる）
+DEFAULT_OCCURRENCES_PATH = os.getenv("DICT_OCCURRENCES_PATH", os.path.join("data", "dict_occurrences.db"))
+
+
+def source_hash(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class OccurrenceIndex:
+    """
+    語句 -> {本, 段落id, 出現回数} の索引。複数スレッドから使える。
+    本は JSON ファイル名（フォルダを除く）で識別する。
+    """
+
+    def __init__(self, db_path=DEFAULT_OCCURRENCES_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        folder = os.path.dirname(db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS books (
+                book TEXT PRIMARY KEY,
+                mtime_ns INTEGER,
+                size INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS paragraphs (
+                book TEXT,
+                paragraph_id TEXT,
+                src_hash TEXT,
+                PRIMARY KEY (book, paragraph_id)
+            );
+            CREATE TABLE IF NOT EXISTS occurrences (
+                book TEXT,
+                paragraph_id TEXT,
+                phrase TEXT,
+                folded TEXT,
+                count INTEGER,
+                PRIMARY KEY (book, paragraph_id, phrase)
+            );
+            CREATE INDEX IF NOT EXISTS occurrences_folded ON occurrences (folded);
+            """
+        )
+        self._conn.commit()
+
+    def book_signatures(self):
+        """
+        本 -> 前回解析したときの JSON の (更新日時[ns], サイズ)
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT book, mtime_ns, size FROM books").fetchall()
+        return {book: (mtime_ns, size) for book, mtime_ns, size in rows}
+
+    def paragraph_hashes(self, book):
+        """
+        本の段落id -> 前回解析したときの原文のハッシュ
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT paragraph_id, src_hash FROM paragraphs WHERE book = ?", (book,)
+            ).fetchall()
+        return dict(rows)
+
+    def book_counts(self, book):
+        """
+        本の語句 -> 出現回数
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT phrase, SUM(count) FROM occurrences WHERE book = ? GROUP BY phrase", (book,)
+            ).fetchall()
+        return dict(rows)
+
+    def update_book(self, book, changed, removed_ids=(), signature=None, commit=True):
+        """
+        本の段落の解析結果を1回のトランザクションで置き換える。
+        changed: 段落id -> (原文のハッシュ, {語句: 出現回数})
+        removed_ids: 本から無くなった段落のid
+        signature: 解析した JSON の (更新日時[ns], サイズ)
+        commit: False の場合は確定しない（続けて更新し、commit() か rollback() を呼ぶ）
+        """
+        paragraph_ids = [(book, pid) for pid in (*changed, *removed_ids)]
+        paragraph_rows = [(book, pid, src_hash) for pid, (src_hash, _) in changed.items()]
+        occurrence_rows = [
+            (book, pid, phrase, phrase.lower(), count)
+            for pid, (_, phrases) in changed.items()
+            for phrase, count in phrases.items()
+        ]
+        with self._lock:
+            self._conn.executemany("DELETE FROM paragraphs WHERE book = ? AND paragraph_id = ?", paragraph_ids)
+            self._conn.executemany("DELETE FROM occurrences WHERE book = ? AND paragraph_id = ?", paragraph_ids)
+            self._conn.executemany("INSERT INTO paragraphs VALUES (?, ?, ?)", paragraph_rows)
+            self._conn.executemany("INSERT INTO occurrences VALUES (?, ?, ?, ?, ?)", occurrence_rows)
+            if signature is not None:
+                self._conn.execute("INSERT OR REPLACE INTO books VALUES (?, ?, ?)", (book, *signature))
+            if commit:
+                self._conn.commit()
+
+    def remove_book(self, book, commit=True):
+        """
+        本の記録をすべて削除する。
+        """
+        with self._lock:
+            for table in ("books", "paragraphs", "occurrences"):
+                self._conn.execute(f"DELETE FROM {table} WHERE book = ?", (book,))
+            if commit:
+                self._conn.commit()
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def rollback(self):
+        with self._lock:
+            self._conn.rollback()
+
+    def find(self, phrase, book=None):
+        """
+        語句（大文字小文字を区別しない）の出現箇所を本ごとに返す。book を指定するとその本だけを返す。
+        戻り値: [{"book": 本, "phrases": 表記の一覧, "paragraph_ids": 段落idの一覧, "count": 出現回数}, ...]
+        """
+        sql = "SELECT book, phrase, paragraph_id, count FROM occurrences WHERE folded = ?"
+        params = [" ".join(phrase.split()).lower()]
+        if book is not None:
+            sql += " AND book = ?"
+            params.append(book)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY book, rowid", params).fetchall()
+
+        results = {}
+        for book_name, found, paragraph_id, count in rows:
+            entry = results.setdefault(
+                book_name, {"book": book_name, "phrases": [], "paragraph_ids": [], "count": 0}
+            )
+            if found not in entry["phrases"]:
+                entry["phrases"].append(found)
+            if paragraph_id not in entry["paragraph_ids"]:
+                entry["paragraph_ids"].append(paragraph_id)
+            entry["count"] += count
+        return list(results.values())
+
+    def get_stats(self):
+        with self._lock:
+            books = self._conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+            paragraphs = self._conn.execute("SELECT COUNT(*) FROM paragraphs").fetchone()[0]
+            phrases = self._conn.execute("SELECT COUNT(DISTINCT folded) FROM occurrences").fetchone()[0]
+        return {"books": books, "paragraphs": paragraphs, "phrases": phrases}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_occurrence_index():
+    """
+    プロセス全体で共有する出現箇所の索引を返す。
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = OccurrenceIndex()
+        return _index
@@ -5,11 +5,15 @@ parapara形式の翻訳データに対して、CSV形式の対訳辞書を適用
 python translate_json.py 翻訳データ.json 対訳辞書.csv
 """
 
+import hashlib
 import json
-import csv
+import os
 import re
 import sys
-from typing import Dict, Tuple
+import threading
+from typing import Dict, Optional, Set, Tuple
+
+from parapara_dict_file import load_table
 
 def load_dictionary(dict_file: str) -> Tuple[Dict[str, str], Dict[str, str]]:
     """CSVの対訳辞書を読み込む
@@ -20,89 +24,493 @@ def load_dictionary(dict_file: str) -> Tuple[Dict[str, str], Dict[str, str]]:
         (辞書_ケースセンシティブ, 辞書_ケースインセンシティブ)
     """
     def wrap_value(val: str) -> str:
-        # 置換対象がアルファベットのみなら q_ と _q でラップする
-        print(f"wrap_value: {val}")
-        if re.fullmatch(r'[A-Za-z]+', val):
-            print(f"wrap_value: {val}")
+        # 置換対象がアルファベットのみ（[A-Za-z]+）なら q_ と _q でラップする
+        if val.isascii() and val.isalpha():
             return f"q_{val}_q"
         return val
 
     print(f"辞書ファイルを読み込みます: {dict_file}")
     dict_cs = {}  # 3列目が1：大文字小文字区別
     dict_ci = {}  # 3列目が0：大文字小文字無視
-    with open(dict_file, newline='', encoding='utf-8') as f:
-        reader = csv.reader(f, delimiter='\t')
-        for row in reader:
-            if len(row) < 2:
-                continue
-            key = row[0].strip()
-            value = row[1].strip()
-            # 辞書読み込み時点で値をチェックしてラップする
-            value = wrap_value(value)
-            mode = row[2].strip() if len(row) >= 3 and row[2].strip() != "" else "0"
-            if mode not in ("0", "1"):
-                continue
-            if mode == "1":
-                dict_cs[key] = value
-            else:
-                # 格納時はキーを小文字に統一しておく
-                dict_ci[key.lower()] = value
+    # 解析済みの列を使う（dict.txt が変わっていなければ TSV を解析し直さない）
+    table = load_table(dict_file)
+    for n, key, value, mode in zip(table.nfields, table.keys, table.values, table.states):
+        if n < 2:
+            continue
+        key = key.strip()
+        # 辞書読み込み時点で値をチェックしてラップする
+        value = wrap_value(value.strip())
+        mode = mode.strip() if n >= 3 and mode.strip() != "" else "0"
+        if mode not in ("0", "1"):
+            continue
+        if mode == "1":
+            dict_cs[key] = value
+        else:
+            # 格納時はキーを小文字に統一しておく
+            dict_ci[key.lower()] = value
     # キーの長さで降順ソート（それぞれについて）
     dict_cs = {k: v for k, v in sorted(dict_cs.items(), key=lambda x: len(x[0]), reverse=True)}
     dict_ci = {k: v for k, v in sorted(dict_ci.items(), key=lambda x: len(x[0]), reverse=True)}
     return dict_cs, dict_ci
 
+def build_trie_pattern(keys, ignore_case: bool) -> Optional[str]:
+    """
+    キーのリストから、共通の接頭辞をまとめた（トライ木の形の）正規表現を作る。
+    各分岐では長いキーを先に試し、後続の条件（直後が英字でない）を満たさなければ短いキーに戻るので、
+    キーを長さの降順に並べた選択（a|b|c...）と同じ箇所に一致する。
+    大文字小文字を無視する場合に、同じ分岐に互いに一致する別の文字（s と ſ など）があると
+    一致する箇所が変わり得るため、None を返す（呼び出し側は従来の正規表現を使う）。
+    """
+    trie = {}
+    for key in keys:
+        node = trie
+        for ch in key:
+            node = node.setdefault(ch, {})
+        # 文字は空文字にならないので、空文字をキーの終端の印に使う
+        node[""] = {}
+
+    def to_regex(node):
+        chars = [ch for ch in node if ch != ""]
+        if ignore_case:
+            for i, a in enumerate(chars):
+                for b in chars[i + 1:]:
+                    if re.fullmatch(re.escape(a), b, re.IGNORECASE):
+                        raise ValueError("ambiguous")
+        branches = [re.escape(ch) + to_regex(node[ch]) for ch in chars]
+        if not branches:
+            return ""
+        if "" in node:
+            # 子を先に試し、だめなら（より短い）このキーで一致させる
+            return "(?:" + "|".join(branches) + ")?"
+        if len(branches) == 1:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")"
+
+    try:
+        return to_regex(trie)
+    except (ValueError, RecursionError):
+        return None
+
+class DictMatcher:
+    """
+    対訳辞書の置換に使う正規表現をコンパイルして保持する。
+    辞書ごとに1回だけ作り、段落ごとの置換では使い回す。
+    """
+
+    def __init__(self, dict_cs: Dict[str, str], dict_ci: Dict[str, str]):
+        self.dict_cs = dict_cs
+        self.dict_ci = dict_ci
+        # 正規表現は最初の置換のときに作る（差分適用では使わないことがある）
+        self._patterns = None
+        self._key_tokens = None
+        self._value_tokens = None
+        self._keys_by_token = None
+
+    def _get_patterns(self):
+        if self._patterns is None:
+            self._patterns = (
+                self._compile(list(self.dict_cs.keys()), False) if self.dict_cs else None,
+                self._compile(list(self.dict_ci.keys()), True) if self.dict_ci else None,
+            )
+        return self._patterns
+
+    def key_tokens(self, previous: Optional["DictMatcher"] = None) -> Dict[str, Optional[Set[str]]]:
+        """
+        キー -> キーに含まれる単語の集合（text_tokens）。両方の辞書のキーをまとめて返す。
+        previous（前の版の辞書）で計算済みのキーはその結果を使う。
+        """
+        if self._key_tokens is None:
+            known = (previous._key_tokens if previous is not None else None) or {}
+            self._key_tokens = {
+                key: known[key] if key in known else text_tokens(key)
+                for key in (*self.dict_cs, *self.dict_ci)
+            }
+        return self._key_tokens
+
+    def value_tokens(self, previous: Optional["DictMatcher"] = None) -> Optional[Set[str]]:
+        """
+        case-sensitive の置換で挿入され得る訳語の単語の集合。単語に分けられない訳語があれば None。
+        case-insensitive の置換は case-sensitive の置換後のテキストに対して行うので、差分適用で使う。
+        """
+        if self._value_tokens is None:
+            known = (previous._value_tokens[0] if previous is not None and previous._value_tokens else None) or {}
+            by_value = {}
+            tokens = set()
+            for value in self.dict_cs.values():
+                if value not in by_value:
+                    by_value[value] = known[value] if value in known else text_tokens(value)
+                    if tokens is not None:
+                        tokens = None if by_value[value] is None else tokens | by_value[value]
+            self._value_tokens = (by_value, tokens)
+        return self._value_tokens[1]
+
+    def subset(self, token_sets, folded_text: str = "") -> "DictMatcher":
+        """
+        token_sets のいずれかの単語の集合に、単語がすべて含まれるキーに絞った DictMatcher を返す。
+        folded_text（fold_text() したテキスト）に単語がすべて部分文字列として含まれるキーも残す。
+        単語に分けられないキーは常に残す。除いたキーは対象のテキストに一致しないので、置換結果は変わらない。
+        """
+        key_tokens = self.key_tokens()
+        if self._keys_by_token is None:
+            # 単語の集合の最小の単語 -> キーのリスト（単語に分けられないキーは None に入れる）
+            self._keys_by_token = {}
+            for key, toks in key_tokens.items():
+                self._keys_by_token.setdefault(min(toks) if toks else None, []).append(key)
+        by_token = self._keys_by_token
+
+        keep = set(by_token.get(None, ()))
+        for tokens in token_sets:
+            for token in tokens:
+                for key in by_token.get(token, ()):
+                    if key_tokens[key] <= tokens:
+                        keep.add(key)
+        if folded_text:
+            keep.update(
+                key for key, toks in key_tokens.items()
+                if key not in keep and toks and all(token in folded_text for token in toks)
+            )
+
+        return DictMatcher(
+            {k: v for k, v in self.dict_cs.items() if k in keep},
+            {k: v for k, v in self.dict_ci.items() if k in keep},
+        )
+
+    @staticmethod
+    def _compile(keys, ignore_case):
+        body = build_trie_pattern(keys, ignore_case)
+        if body is None:
+            # キーを長さの降順に並べた選択（トライ木にできない場合）
+            body = '(?:' + '|'.join(map(re.escape, keys)) + ')'
+        flags = re.IGNORECASE if ignore_case else 0
+        return re.compile(r'(?<![A-Za-z])' + body + r'(?![A-Za-z])', flags)
+
+    def replace(self, text: str) -> str:
+        """
+        先に case-sensitive の置換、その後に case-insensitive の置換を行う。
+        """
+        pattern_cs, pattern_ci = self._get_patterns()
+        if pattern_cs is not None:
+            dict_cs = self.dict_cs
+            text = pattern_cs.sub(lambda m: dict_cs.get(m.group(0), m.group(0)), text)
+        if pattern_ci is not None:
+            dict_ci = self.dict_ci
+            text = pattern_ci.sub(lambda m: dict_ci.get(m.group(0).lower(), m.group(0)), text)
+        return text
+
+# 辞書ファイルのパス -> ((mtime, サイズ), DictMatcher)
+_matcher_cache = {}
+_matcher_lock = threading.Lock()
+
+def load_matcher(dict_file: str) -> DictMatcher:
+    """
+    辞書ファイルを読み込んで DictMatcher を返す。
+    ファイルの更新日時とサイズが変わらない限り、前回作ったものを返す。
+    """
+    st = os.stat(dict_file)
+    signature = (st.st_mtime_ns, st.st_size)
+    with _matcher_lock:
+        cached = _matcher_cache.get(dict_file)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+    dict_cs, dict_ci = load_dictionary(dict_file)
+    matcher = DictMatcher(dict_cs, dict_ci)
+    with _matcher_lock:
+        _matcher_cache[dict_file] = (signature, matcher)
+    return matcher
+
 def replace_with_dict(text: str, dict_cs: Dict[str, str], dict_ci: Dict[str, str]) -> str:
     """
     text内の語句を、dict_cs (case-sensitive) および dict_ci (case-insensitive) を用いて置換する。
     先に case-sensitive の置換、その後に case-insensitive の置換を行う。
+    呼び出すたびに正規表現を作るので、多数のテキストを置換する場合は DictMatcher を使い回すこと。
     """
-    # 大文字小文字区別の置換 (dict_cs)
-    if dict_cs:
-        pattern_cs = r'(?<![A-Za-z])(?:' + '|'.join(map(re.escape, dict_cs.keys())) + r')(?![A-Za-z])'
-        def repl_cs(match):
-            return dict_cs.get(match.group(0), match.group(0))
-        text = re.sub(pattern_cs, repl_cs, text)
-    # 大文字小文字無視の置換 (dict_ci)
-    if dict_ci:
-        pattern_ci = r'(?i)(?<![A-Za-z])(?:' + '|'.join(map(re.escape, dict_ci.keys())) + r')(?![A-Za-z])'
-        def repl_ci(match):
-            return dict_ci.get(match.group(0).lower(), match.group(0))
-        text = re.sub(pattern_ci, repl_ci, text)
-    return text
+    return DictMatcher(dict_cs, dict_ci).replace(text)
 
 def count_alphabet_chars(text: str) -> int:
     """アルファベットの文字数をカウント"""
     return len(re.findall(r'[a-zA-Z]', text))
 
-def file_replace_with_dict(trans_file: str, dict_file: str):
+def apply_to_paragraph(paragraph: dict, matcher: DictMatcher):
+    """
+    1段落の src_text に辞書を適用して src_replaced を更新する。段落が変わった場合は True を返す。
+    """
+    before = (paragraph.get("src_replaced"), paragraph.get("trans_status"), paragraph.get("trans_text"), paragraph.get("trans_auto"))
+    replaced_text = matcher.replace(paragraph["src_text"])
+    # 対訳辞書の変更により、置換結果が以前と異なる場合は翻訳状態を "none" に変更
+    if replaced_text != paragraph.get("src_replaced") and paragraph.get("trans_status") == "auto":
+        paragraph["trans_status"] = "none"
+    paragraph["src_replaced"] = replaced_text
+
+    alphabet_count = count_alphabet_chars(replaced_text)
+    if alphabet_count < 1:
+        paragraph["trans_auto"] = replaced_text
+        paragraph["trans_text"] = replaced_text
+        paragraph["trans_status"] = "fixed"
+    elif alphabet_count < 2:
+        paragraph["trans_auto"] = replaced_text
+        paragraph["trans_text"] = replaced_text
+        paragraph["trans_status"] = "draft"
+    return before != (paragraph["src_replaced"], paragraph.get("trans_status"), paragraph.get("trans_text"), paragraph.get("trans_auto"))
+
+# 差分適用の索引に使う単語（置換の境界の判定と同じく ASCII の英字の並び）
+TOKEN_RE = re.compile(r'[A-Za-z]+')
+# 大文字小文字を無視した照合で ASCII の英字と一致する、ASCII 以外の文字（ſ=s, ı=i, İ=i, K=k）
+FOLDING_CHARS = frozenset("\u017f\u0131\u0130\u212a")
+FOLDING_TABLE = str.maketrans("\u017f\u0131\u0130\u212a", "siik")
+
+def text_tokens(text: str) -> Optional[Set[str]]:
+    """
+    テキストに含まれる単語（英字の並びを小文字にしたもの）の集合を返す。
+    キーがテキストに一致する場合、キーの単語はすべてテキストの単語に含まれる（前後が英字でないため）。
+    英字と一致し得る ASCII 以外の文字を含む場合は、単語では判定できないので None を返す。
+    """
+    if FOLDING_CHARS.intersection(text):
+        return None
+    return {token.lower() for token in TOKEN_RE.findall(text)}
+
+def fold_text(text: str) -> str:
+    """
+    FOLDING_CHARS を一致する英字に置き換えて小文字にする。単語に分けられないテキストの絞り込みに使う。
+    """
+    return text.translate(FOLDING_TABLE).lower()
+
+def source_hash(src_text: str, src_replaced: Optional[str]) -> str:
+    return hashlib.blake2b(f"{src_text}\0{src_replaced}".encode("utf-8"), digest_size=8).hexdigest()
+
+def state_path(json_path: str) -> str:
+    """
+    前回適用した辞書と段落を記録するファイルのパス（本のJSONと同じフォルダ）。
+    """
+    return json_path + ".dictstate"
+
+# 記録ファイルを書き出すまでの待ち時間（秒）。続けて適用した場合はまとめて書き出す
+STATE_SAVE_DELAY = 2.0
+
+class DictApplyState:
+    """
+    本に前回適用した辞書（matcher）と、そのときの各段落を記録する。
+    ・sources: 段落id -> src_text と src_replaced のハッシュ（ファイルに保存する）
+      どちらかが変わった段落（原文の編集、本のJSONを書き出す前の異常終了など）は置換し直す。
+    ・index: 単語 -> その単語を含む段落idの集合（メモリ上だけに持ち、無ければ作る）
+      原文が変わった段落の古い単語は消さないので、実際より多めの段落を指すことがある（置換し直すだけで害はない）。
+    記録ファイルが古くても、置換し直す段落が増えるだけで結果は変わらない。
+    """
+
+    def __init__(self, dict_file, matcher, sources):
+        self.dict_file = dict_file
+        self.matcher = matcher
+        self.sources = sources
+        # 段落id -> 確認済みの (src_text, src_replaced)。同じ文字列オブジェクトならハッシュを計算しない
+        self.texts = {}
+        self.index = None
+        # 単語で判定できない段落のid（常に置換し直す）
+        self.special = set()
+        self.timer = None
+
+    def unchanged(self, pid, p):
+        src_text = p["src_text"]
+        src_replaced = p.get("src_replaced")
+        known = self.texts.get(pid)
+        if known is not None and known[0] is src_text and known[1] is src_replaced:
+            return True
+        if self.sources.get(pid) == source_hash(src_text, src_replaced):
+            self.texts[pid] = (src_text, src_replaced)
+            return True
+        return False
+
+    def record(self, pid, p):
+        self.sources[pid] = source_hash(p["src_text"], p.get("src_replaced"))
+        self.texts[pid] = (p["src_text"], p.get("src_replaced"))
+        if self.index is not None:
+            self.add_to_index(pid, p["src_text"])
+
+    def add_to_index(self, pid, text):
+        tokens = text_tokens(text)
+        if tokens is None:
+            self.special.add(pid)
+            return
+        self.special.discard(pid)
+        for token in tokens:
+            self.index.setdefault(token, set()).add(pid)
+
+    def build_index(self, paragraphs_by_id):
+        self.index = {}
+        self.special = set()
+        for pid, p in paragraphs_by_id.items():
+            self.add_to_index(pid, p["src_text"])
+
+    def lookup(self, tokens):
+        """
+        tokens の単語をすべて含む段落のidの集合を返す（単語で判定できない段落を含む）。
+        """
+        result = None
+        for token in sorted(tokens, key=lambda t: len(self.index.get(t, ()))):
+            ids = self.index.get(token, set())
+            result = set(ids) if result is None else result & ids
+            if not result:
+                break
+        return (result or set()) | self.special
+
+    def schedule_save(self, json_path):
+        """
+        STATE_SAVE_DELAY 秒後に記録ファイルを書き出す。
+        """
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = threading.Timer(STATE_SAVE_DELAY, self.save, args=(json_path,))
+        self.timer.daemon = True
+        self.timer.start()
+
+    def save(self, json_path):
+        with _state_lock:
+            self.timer = None
+            data = json.dumps({
+                "dict_file": self.dict_file,
+                "dict_cs": self.matcher.dict_cs,
+                "dict_ci": self.matcher.dict_ci,
+                "sources": self.sources,
+            }, ensure_ascii=False)
+        tmp_path = state_path(json_path) + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, state_path(json_path))
+        except OSError as e:
+            print(f"Warning: {state_path(json_path)} を保存できません: {e}")
+
+    @classmethod
+    def load(cls, json_path):
+        try:
+            with open(state_path(json_path), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cls(data["dict_file"], DictMatcher(data["dict_cs"], data["dict_ci"]), data["sources"])
+
+# 本のJSONのパス -> DictApplyState
+_apply_states = {}
+_state_lock = threading.RLock()
+
+def changed_keys(old: Dict[str, str], new: Dict[str, str]) -> Set[str]:
+    """
+    追加・削除・訳語の変更があったキーの集合を返す。
+    """
+    if old is new:
+        return set()
+    changed = {key for key, value in new.items() if old.get(key) != value}
+    changed.update(key for key in old if key not in new)
+    return changed
+
+def apply_dict_to_book(book_data: dict, json_path: str, dict_file: str, full: bool = False, save_now: bool = False) -> dict:
+    """
+    book_data（メモリ上の parapara 形式データ）に辞書を適用する。
+    前回この本に適用した辞書の記録があれば、その後に追加・変更・削除された語句を含む段落と、
+    原文が変わった段落だけを置換し直す（差分適用）。記録が無い場合や full が True の場合は全段落を置換する。
+    どちらも置換結果は全段落を置換した場合と同じになる。
+    適用の記録は少し後に書き出す（save_now が True ならすぐに書き出す）。
+    戻り値: {"mode": "full" か "incremental", "changed_terms": 変わった語句数,
+             "paragraphs": 置換し直した段落数, "updated": 内容が変わった段落数}
+    """
+    matcher = load_matcher(dict_file)
+    dict_file_key = os.path.abspath(dict_file)
+    with _state_lock:
+        state = _apply_states.get(json_path)
+        if state is None:
+            state = DictApplyState.load(json_path)
+        if state is not None and state.dict_file != dict_file_key:
+            state = None
+
+        paragraphs_by_id = {str(p.get("id")): p for p in book_data.get("paragraphs", []) if "src_text" in p}
+        changed_terms = 0
+        targets = None
+        use_matcher = matcher
+        if state is not None and not full:
+            previous = state.matcher
+            changed_cs = changed_keys(previous.dict_cs, matcher.dict_cs)
+            changed_ci = changed_keys(previous.dict_ci, matcher.dict_ci)
+            changed_terms = len(changed_cs) + len(changed_ci)
+            if state.index is None:
+                state.build_index(paragraphs_by_id)
+            # case-insensitive のキーは、case-sensitive の置換で挿入された訳語にも一致し得る
+            inserted = matcher.value_tokens(previous)
+            old_inserted = previous.value_tokens()
+            if inserted is not None and old_inserted is not None:
+                inserted = inserted | old_inserted
+            else:
+                inserted = None
+
+            dirty = {pid for pid, p in paragraphs_by_id.items() if not state.unchanged(pid, p)}
+            for key in changed_cs | changed_ci:
+                tokens = text_tokens(key)
+                if not tokens or (key in changed_ci and (inserted is None or tokens & inserted)):
+                    # 単語で段落を絞れないキーが変わった場合は全段落を置換する
+                    dirty = None
+                    break
+                dirty |= state.lookup(tokens)
+
+            if dirty is not None:
+                targets = [paragraphs_by_id[pid] for pid in dirty if pid in paragraphs_by_id]
+                if inserted is not None and len(targets) < len(paragraphs_by_id) / 2 and matcher._patterns is None:
+                    # 置換し直す段落に一致し得るキーに絞る（辞書全体の正規表現を作るより速い）
+                    token_sets = []
+                    folded = []
+                    for p in targets:
+                        toks = text_tokens(p["src_text"])
+                        if toks is None:
+                            folded.append(fold_text(p["src_text"]))
+                        else:
+                            token_sets.append(toks | inserted)
+                    matcher.key_tokens(previous)
+                    use_matcher = matcher.subset(token_sets, "\n".join(folded))
+
+        mode = "incremental"
+        if targets is None:
+            mode = "full"
+            targets = list(paragraphs_by_id.values())
+            if state is not None and state.timer is not None:
+                state.timer.cancel()
+            state = DictApplyState(dict_file_key, matcher, {})
+            state.index = {}
+            # 次の差分適用で使う（辞書を変更しても、変わらないキーの結果は引き継ぐ）
+            matcher.key_tokens()
+
+        updated = 0
+        for p in targets:
+            if apply_to_paragraph(p, use_matcher):
+                updated += 1
+            state.record(str(p.get("id")), p)
+
+        # 削除された段落の記録を消す
+        if len(state.sources) > len(paragraphs_by_id):
+            for pid in [pid for pid in state.sources if pid not in paragraphs_by_id]:
+                del state.sources[pid]
+                state.texts.pop(pid, None)
+        state.matcher = matcher
+        _apply_states[json_path] = state
+        if save_now:
+            state.save(json_path)
+        else:
+            state.schedule_save(json_path)
+
+    print(f"辞書を適用しました（{mode}）: 変更された語句 {changed_terms} 件、置換した段落 {len(targets)} 件、変更された段落 {updated} 件")
+    return {"mode": mode, "changed_terms": changed_terms, "paragraphs": len(targets), "updated": updated}
+
+def file_replace_with_dict(trans_file: str, dict_file: str, full: bool = True):
+    """
+    JSONファイルに辞書を適用して保存する。full が False の場合は前回からの差分だけを適用する。
+    """
     print(f"処理を開始します")
-    dict_cs, dict_ci = load_dictionary(dict_file)
+    load_matcher(dict_file)
     print(f"辞書の読み込みが完了しました: {dict_file}")
     
     with open(trans_file, encoding='utf-8') as f:
         data = json.load(f)
     
-    for paragraph in data.get("paragraphs", []):
-        if "src_text" in paragraph:
-            replaced_text = replace_with_dict(paragraph["src_text"], dict_cs, dict_ci)
-            # 対訳辞書の変更により、置換結果が以前と異なる場合は翻訳状態を "none" に変更
-            if replaced_text != paragraph.get("src_replaced") and paragraph.get("trans_status") == "auto":
-                paragraph["trans_status"] = "none"
-            paragraph["src_replaced"] = replaced_text
-            
-            alphabet_count = count_alphabet_chars(replaced_text)
-            if alphabet_count < 1:
-                paragraph["trans_auto"] = replaced_text
-                paragraph["trans_text"] = replaced_text
-                paragraph["trans_status"] = "fixed"
-            elif alphabet_count < 2:
-                paragraph["trans_auto"] = replaced_text
-                paragraph["trans_text"] = replaced_text
-                paragraph["trans_status"] = "draft"
+    result = apply_dict_to_book(data, trans_file, dict_file, full=full, save_now=True)
     
     with open(trans_file, 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+    return result
 
 def main():
     if len(sys.argv) != 3:
@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 import sys
 import os
-import csv
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from api_translate import translate_text  # 翻訳関数は別ファイルで定義済み
+from api_translate import translate_texts, get_batch_limits  # 翻訳関数は別ファイルで定義済み
+from parapara_dict_file import load_table, write_tsv
+from parapara_trans_memory import get_translation_memory
+from parapara_trans import DEFAULT_CONCURRENCY, backend_name, pack_batches
 
 def is_katakana(text):
     """
@@ -15,13 +18,75 @@ def is_katakana(text):
         return False
     return re.fullmatch(r"[ァ-ンー\s　]+", text) is not None
 
-def dict_trans(dict_filename):
+def translate_terms(terms, concurrency=None, translator=None, memory=None, progress=None):
+    """
+    語句のリストを翻訳し、語句 -> 訳文 の dict を返す。
+    ・翻訳メモリにある語句は翻訳APIに送らない。
+    ・残りは翻訳サービスの1リクエストの上限まで詰め、最大 concurrency 件まで同時に送る。
+    ・失敗したリクエストの語句は戻り値に含めない（未翻訳のまま残る）。
+    translator: 翻訳関数（省略時は translate_texts）。テキストのリストを受け取り、訳文のリストを返す。
+    progress: 指定すると、語句の訳文が決まるごとに progress(完了数, 語句数, 送信した文字数) を呼ぶ。
+    """
+    memory = memory or get_translation_memory()
+    backend = backend_name(translator)
+    limits = get_batch_limits(None if translator is None else backend)
+    translator = translator or translate_texts
+    if concurrency is None:
+        concurrency = DEFAULT_CONCURRENCY
+    concurrency = max(1, concurrency)
+
+    results = {}
+    misses = []
+    for term in terms:
+        translation = memory.get(term, "EN", "JA", backend)
+        if translation is None:
+            misses.append(term)
+        else:
+            results[term] = translation
+    done = len(results)
+    if progress is not None:
+        progress(done, len(terms))
+
+    batches = pack_batches(misses, limits, segment=lambda term: term)
+    print(f"辞書翻訳: {len(terms)} 語句（翻訳メモリ {len(results)} 件、翻訳API {len(misses)} 件 / {len(batches)} リクエスト）")
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(translator, batch, source="EN", target="JA"): batch for batch in batches}
+        try:
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    translations = future.result()
+                except Exception as e:
+                    print(f"Error: 翻訳APIの呼び出しに失敗しました: {e}")
+                    translations = None
+                if translations is not None and len(translations) != len(batch):
+                    print(f"Warning: 送信した語句数 {len(batch)} と訳文の数 {len(translations)} が一致しません。")
+                    translations = None
+                if translations is not None:
+                    items = list(zip(batch, translations))
+                    results.update(items)
+                    memory.put_many(items, "EN", "JA", backend)
+                done += len(batch)
+                if progress is not None:
+                    progress(done, len(terms), sum(len(term) for term in batch))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return results
+
+def dict_trans(dict_filename, concurrency=None, translator=None, progress=None):
     """
     指定された dict_filename のCSVファイルを読み込み、state が9のエントリの value を翻訳して
     以下の条件で state を更新し、再度ファイルに保存する関数。
       - 翻訳前後が同じなら state を "7" にする
       - 翻訳結果が全てカタカナなら state を "6" にする
       - それ以外は state を "8"（自動翻訳）にする
+    翻訳は translate_terms でまとめて行う（翻訳済みの語句は翻訳メモリから取得する）。
+    翻訳に失敗した語句は state 9 のまま残す。
+    concurrency: 同時に翻訳APIへ送るリクエスト数（省略時は TRANS_CONCURRENCY）
+    translator: 翻訳関数（省略時は translate_texts）。テスト用のスタブに差し替えられる。
+    progress: 指定すると、語句の訳文が決まるごとに progress(完了数, 翻訳対象数, 送信した文字数) を呼ぶ。
     """
     if not os.path.exists(dict_filename):
         print(f"{dict_filename} が存在しません。")
@@ -30,31 +95,32 @@ def dict_trans(dict_filename):
     updated_dict = {}
 
     try:
-        with open(dict_filename, "r", encoding="utf-8", newline="") as f:
-            reader = csv.reader(f, delimiter='\t')
-            for row in reader:
-                if not row:
-                    continue
-                if len(row) == 2:
-                    key, value = row
-                    state = "0"
-                elif len(row) >= 3:
-                    key, value, state = row[0], row[1], row[2]
-                else:
-                    continue
+        entries = []
+        # 解析済みの列を使う（dict.txt が変わっていなければ TSV を解析し直さない）
+        table = load_table(dict_filename)
+        for n, key, value, state in zip(table.nfields, table.keys, table.values, table.states):
+            if n < 2:
+                continue
+            if n == 2:
+                state = "0"
+            entries.append((key, value, state))
+
+        terms = list(dict.fromkeys(key for key, value, state in entries if state == "9"))
+        translations = translate_terms(terms, concurrency=concurrency, translator=translator, progress=progress)
 
-                if state == "9":
-                    translated_value = translate_text(key)
-                    # 状態更新の条件
-                    if translated_value == value:
-                        new_state = "7"
-                    elif is_katakana(translated_value):
-                        new_state = "6"
-                    else:
-                        new_state = "8"
-                    updated_dict[key] = (translated_value, new_state)
+        for key, value, state in entries:
+            if state == "9" and key in translations:
+                translated_value = translations[key]
+                # 状態更新の条件
+                if translated_value == value:
+                    new_state = "7"
+                elif is_katakana(translated_value):
+                    new_state = "6"
                 else:
-                    updated_dict[key] = (value, state)
+                    new_state = "8"
+                updated_dict[key] = (translated_value, new_state)
+            else:
+                updated_dict[key] = (value, state)
     except Exception as e:
         print(f"Error reading {dict_filename}: {e}")
         return
@@ -63,11 +129,7 @@ def dict_trans(dict_filename):
     sorted_keys = sorted(updated_dict.keys(), key=lambda s: (-len(s), s))
 
     try:
-        with open(dict_filename, "w", encoding="utf-8", newline="") as out_file:
-            writer = csv.writer(out_file, delimiter='\t')
-            for key in sorted_keys:
-                value, state = updated_dict[key]
-                writer.writerow([key, value, state])
+        write_tsv(dict_filename, ([key, *updated_dict[key]] for key in sorted_keys))
     except Exception as e:
         print(f"Error writing {dict_filename}: {e}")
         return
@@ -0,0 +1,222 @@
+"""
+時間のかかる処理（全翻訳、パラグラフ抽出、自動タグ付け、辞書抽出、辞書翻訳）をバックグラウンドで実行するジョブ管理。
+
+・投入するとジョブIDを返し、処理はワーカースレッドのプールで実行する。
+・処理関数は progress(done, total, chars) を呼んで進捗（件数、送信文字数）を報告する。
+  進捗から経過時間と残り時間（ETA）を計算する。
+・キャンセルされたジョブは、次の progress() の呼び出しで JobCancelled を送出して止まる。
+・ジョブは対象ファイル（JSON・辞書）のパスを占有し、同じファイルを扱うジョブは同時に実行しない。
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+# 同時に実行するジョブ数（.env の JOB_WORKERS で変更できる）
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# 終了したジョブを保持する件数（古いものから削除する）
+MAX_FINISHED_JOBS = 100
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobCancelled(BaseException):
+    """
+    ジョブがキャンセルされたことを表す。
+    処理関数の中の except Exception で握りつぶされないよう、BaseException から派生させる。
+    """
+
+
+class BookBusyError(Exception):
+    """
+    対象のファイルを他のジョブが使用中であることを表す。
+    """
+
+
+class Job:
+    """
+    1つのジョブの状態と進捗。
+    """
+
+    def __init__(self, kind, keys, unit):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.keys = tuple(keys)
+        self.unit = unit
+        self.status = "queued"
+        self.done = 0
+        self.total = 0
+        self.chars = 0
+        self.message = ""
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+
+    def progress(self, done, total=None, chars=0):
+        """
+        進捗を報告する。done: 完了件数、total: 全件数、chars: 今回送信した文字数（累計に加える）。
+        キャンセルされていれば JobCancelled を送出する。
+        """
+        if self._cancel.is_set():
+            raise JobCancelled()
+        with self._lock:
+            self.done = done
+            if total is not None:
+                self.total = total
+            self.chars += chars
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def to_dict(self):
+        """
+        状態を JSON に変換できる dict で返す。
+        """
+        with self._lock:
+            done, total, chars = self.done, self.total, self.chars
+        now = self.finished_at or time.time()
+        elapsed = now - self.started_at if self.started_at else 0.0
+        eta = None
+        if self.status == "running" and 0 < done < total:
+            eta = elapsed * (total - done) / done
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "unit": self.unit,
+            "done": done,
+            "total": total,
+            "percent": round(done * 100 / total, 1) if total else None,
+            "chars": chars,
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "message": self.message,
+            "result": self.result,
+            "cancel_requested": self.cancelled,
+        }
+
+
+class JobManager:
+    """
+    ジョブの投入、実行、状態の取得、キャンセルを管理する。
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        # 同期処理（ジョブ以外）が占有しているファイルのパス
+        self._held = set()
+
+    def _busy_keys(self):
+        keys = set(self._held)
+        for job in self._jobs.values():
+            if job.status in ACTIVE_STATUSES:
+                keys.update(job.keys)
+        return keys
+
+    def is_busy(self, key):
+        """
+        key（ファイルのパス）を実行中または待機中のジョブが使っていれば True。
+        """
+        with self._lock:
+            return key in self._busy_keys()
+
+    def submit(self, kind, keys, func, unit="件"):
+        """
+        func(progress) をバックグラウンドで実行するジョブを投入する。
+        keys: ジョブが読み書きするファイルのパス。使用中なら BookBusyError。
+        unit: 進捗の件数の単位（表示用）
+        戻り値: Job
+        """
+        job = Job(kind, keys, unit)
+        with self._lock:
+            if self._busy_keys() & set(job.keys):
+                raise BookBusyError(f"{', '.join(job.keys)} は他の処理で使用中です")
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, func)
+        return job
+
+    @contextmanager
+    def hold(self, keys):
+        """
+        ジョブを使わずに同期で処理する間、keys を占有する。使用中なら BookBusyError。
+        """
+        keys = set(keys)
+        with self._lock:
+            if self._busy_keys() & keys:
+                raise BookBusyError(f"{', '.join(sorted(keys))} は他の処理で使用中です")
+            self._held.update(keys)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._held.difference_update(keys)
+
+    def _run(self, job, func):
+        # cancel() と同じロックで状態を変え、待機中にキャンセルされたジョブは実行しない
+        with self._lock:
+            if job.status != "queued":
+                return
+            job.status = "running"
+            job.started_at = time.time()
+        try:
+            job.result = func(job.progress)
+            job.status = "done"
+        except JobCancelled:
+            job.status = "cancelled"
+            job.message = "キャンセルしました"
+        except (Exception, SystemExit) as e:
+            print(f"Error: ジョブ {job.kind} ({job.id}) が失敗しました: {e}")
+            job.status = "error"
+            job.message = str(e)
+        finally:
+            job.finished_at = time.time()
+            print(f"ジョブ {job.kind} ({job.id}) が終了しました: {job.status}")
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status not in ACTIVE_STATUSES]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        """
+        ジョブのキャンセルを要求する。待機中ならその場で終了させ（対象ファイルの占有もすぐに解く）、
+        実行中なら次の進捗報告で止まる。
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.cancel()
+                if job.status == "queued":
+                    job.status = "cancelled"
+                    job.message = "キャンセルしました"
+                    job.finished_at = time.time()
+        return job
+
+
+# サーバ全体で共有するインスタンス
+job_manager = JobManager()
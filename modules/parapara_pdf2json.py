@@ -12,48 +12,272 @@ PDFファイルから段落情報を抽出し、翻訳管理用のparapara形式
 import sys
 import os
 import json
+import fitz
 
-from _03_pdf_to_json_structure import extract_pdf_structure
-from _04_paragraph_generator import generate_paragraphs
+from _03_pdf_to_json_structure import get_pdf_info, iter_pdf_structure
+from _04_paragraph_generator import iter_page_lines, iter_paragraphs
 
-def extract_paragraphs(pdf_path, json_path=None):
+# 再抽出したパラグラフで原文が一致する場合に引き継ぐ翻訳関連の項目
+CARRY_OVER_KEYS = ("src_replaced", "trans_auto", "trans_text", "trans_status", "block_tag", "comments")
+
+def parse_page_ranges(text):
+    """
+    "3,5-7" のようなページ指定をページ番号（1始まり）の昇順リストに変換する。
+    """
+    pages = set()
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            pages.update(range(int(start), int(end) + 1))
+        else:
+            pages.add(int(part))
+    return sorted(pages)
+
+def recalc_trans_status_counts(data):
+    """
+    段落の翻訳ステータスを集計し、trans_status_countsに書き込む。
+    """
+    counts = {"none": 0, "auto": 0, "draft": 0, "fixed": 0}
+    for p in data.get("paragraphs", []):
+        status = p.get("trans_status")
+        if status in counts:
+            counts[status] += 1
+    data["trans_status_counts"] = counts
+
+def report_pages(pages_iter, total, progress):
+    """
+    ページを1つ受け取るごとに progress(受け取ったページ数, total) を呼ぶジェネレータ。
+    """
+    for done, page in enumerate(pages_iter, 1):
+        progress(done, total)
+        yield page
+
+def group_adjacent_pages(pages):
+    """
+    ページ番号のリストを、連続するページの区間 [(先頭, 末尾), ...] に分ける。
+    """
+    runs = []
+    for page in sorted(set(pages)):
+        if runs and runs[-1][1] == page - 1:
+            runs[-1] = (runs[-1][0], page)
+        else:
+            runs.append((page, page))
+    return runs
+
+def page_has_text(page):
+    return any(line.get("spans") for line in iter_page_lines(page))
+
+def continues_into(left, right):
+    """
+    left ページの最後の段落が right ページに続いている（段落がページをまたぐ）場合に True を返す。
+    left だけから生成した段落と、left と right を続けて生成した段落のうち left から始まるものを比べる。
+    """
+    alone = [p["src_text"] for p in iter_paragraphs([left], {}) if p["page"] == left["page"]]
+    joined = [p["src_text"] for p in iter_paragraphs([left, right], {}) if p["page"] == left["page"]]
+    return alone != joined
+
+def widen_runs(runs, page_count, get_page):
+    """
+    再抽出する区間を、区間の端をまたぐ段落がなくなるまで前後のページに広げる。
+    段落はページをまたいで続くことがあるので、区間の先頭ページの最初の段落が前のページから
+    続いている場合や、区間の最後の段落が次のページに続いている場合は、そのページも区間に含める。
+    広げた結果、重なったり隣り合ったりした区間はまとめる。
+    get_page: ページ番号 -> ページ構造
+    """
+    def nearest_text_page(page, step, stop):
+        while page != stop:
+            if page_has_text(get_page(page)):
+                return page
+            page += step
+        return None
+
+    widened = []
+    for start, end in runs:
+        while True:
+            # 区間の最初の段落が、前のページから続いていないか
+            first = nearest_text_page(start, 1, end + 1)
+            before = nearest_text_page(start - 1, -1, 0)
+            if first is not None and before is not None and continues_into(get_page(before), get_page(first)):
+                start = before
+                continue
+            # 区間の最後の段落が、次のページに続いていないか
+            last = nearest_text_page(end, -1, start - 1)
+            after = nearest_text_page(end + 1, 1, page_count + 1)
+            if last is not None and after is not None and continues_into(get_page(last), get_page(after)):
+                end = after
+                continue
+            break
+        if widened and start <= widened[-1][1] + 1:
+            widened[-1] = (widened[-1][0], max(end, widened[-1][1]))
+        else:
+            widened.append((start, end))
+    return widened
+
+def reextract_pages(pdf_path, json_path, pages, workers=1, progress=None):
+    """
+    既存のJSONのうち、指定ページ（1始まり）のパラグラフだけをPDFから作り直してマージする。
+    ・他のページのパラグラフは id、訳文、翻訳ステータスを含めてそのまま残す。
+    ・ページをまたぐ段落を途中で切ったり重複させたりしないよう、連続するページの区間ごとに、
+      区間の端をまたぐ段落がなくなるまで前後のページを含めて作り直す（widen_runs）。
+    ・新しいパラグラフには既存の最大 id より大きい id を振る。
+    ・同じページで原文が一致する旧パラグラフがあれば、訳文などを引き継ぐ。
+    progress: 指定すると、ページを解析するごとに progress(解析済みページ数, ページ数) を呼ぶ。
+    """
+    with open(json_path, "r", encoding="utf-8") as f:
+        json_data = json.load(f)
+
+    print(f"ページ {pages} を再抽出します...")
+    doc = fitz.open(pdf_path)
+    book_data = get_pdf_info(doc, pdf_path)
+    doc.close()
+    page_count = book_data["page_count"]
+    runs = group_adjacent_pages(p for p in pages if 1 <= p <= page_count)
+
+    # 指定ページと、その前後のページ（段落がまたいでいないかの判定に使う）をまとめて解析する
+    structures = {}
+    first_pages = sorted({p for start, end in runs for p in range(start - 1, end + 2) if 1 <= p <= page_count})
+    pages_iter = iter_pdf_structure(pdf_path, workers=workers, pages=first_pages)
+    if progress is not None:
+        pages_iter = report_pages(pages_iter, len(first_pages), progress)
+    for page in pages_iter:
+        structures[page["page"]] = page
+
+    def get_page(number):
+        # 区間を広げて必要になったページは1ページずつ解析する
+        if number not in structures:
+            for page in iter_pdf_structure(pdf_path, pages=[number]):
+                structures[page["page"]] = page
+        return structures[number]
+
+    runs = widen_runs(runs, page_count, get_page)
+    target_pages = {p for start, end in runs for p in range(start, end + 1)}
+    if target_pages != set(pages):
+        print(f"ページをまたぐ段落があるため、ページ {[f'{start}-{end}' for start, end in runs]} を再抽出します。")
+
+    old_paragraphs = json_data.get("paragraphs", [])
+    next_id = max((int(p["id"]) for p in old_paragraphs), default=0) + 1
+
+    # 区間ごとに、前の区間の状態を引き継がずに段落を生成する
+    new_paragraphs = []
+    style_dict = {}
+    for start, end in runs:
+        run_pages = [get_page(p) for p in range(start, end + 1)]
+        for p in iter_paragraphs(run_pages, style_dict, start_id=next_id):
+            next_id = p["id"] + 1
+            # 先頭に生成される空の段落（page 0）は取り込まない
+            if p["page"] in target_pages:
+                new_paragraphs.append(p)
+
+    # 再抽出対象ページの旧パラグラフを原文で引けるようにする
+    replaced = {}
+    kept = []
+    for p in old_paragraphs:
+        if p.get("page") in target_pages:
+            replaced.setdefault((p.get("page"), p.get("src_text")), []).append(p)
+        else:
+            kept.append(p)
+
+    for p in new_paragraphs:
+        candidates = replaced.get((p["page"], p["src_text"]))
+        if candidates:
+            old = candidates.pop(0)
+            for key in CARRY_OVER_KEYS:
+                if key in old:
+                    p[key] = old[key]
+
+    paragraphs = kept + new_paragraphs
+    # ページ内の並びは維持したまま、ページ順に並べ直す
+    paragraphs.sort(key=lambda p: p.get("page", 0))
+    json_data["paragraphs"] = paragraphs
+
+    head_styles = dict(json_data.get("head_styles", {}))
+    head_styles.update(style_dict)
+    json_data["head_styles"] = {k: v for k, v in sorted(head_styles.items(), key=lambda x: x[0])}
+
+    recalc_trans_status_counts(json_data)
+
+    # 翻訳済みの既存のJSONを壊さないよう、一時ファイルに書いてから置き換える
+    tmp_path = json_path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(json_data, f, indent=2, ensure_ascii=False)
+    except BaseException:
+        # 中断（キャンセルを含む）した場合は書きかけの一時ファイルを消す
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, json_path)
+    print(f"ページ {sorted(target_pages)} のparagraphsを {json_path} にマージしました。")
+
+    return json_data
+
+def extract_paragraphs(pdf_path, json_path=None, workers=1, pages=None, progress=None):
+    """
+    workers: ページ解析に使うプロセス数。1なら逐次処理、0以下ならCPU数。
+    pages: ページ番号（1始まり）のリスト。JSONが既に存在する場合、そのページだけを再抽出してマージする。
+    progress: 指定すると、ページを解析するごとに progress(解析済みページ数, ページ数) を呼ぶ。
+    全体を抽出する場合は段落本体ではなく、書き出した文書情報と段落数を返す。
+    """
     if not pdf_path.lower().endswith(".pdf"):
         raise ValueError("対象ファイルはPDFではありません。")
 
-    # PDFの構造抽出
-    print("PDFの解析を開始します...")
-    book_data = extract_pdf_structure(pdf_path)
-
     # 出力ファイル名の作成
     if json_path is None:
         base_name = os.path.splitext(os.path.basename(pdf_path))[0]
         folder = os.path.dirname(pdf_path)
         json_path = os.path.join(folder, f"{base_name}.json")
 
-    style_and_paragraphs = generate_paragraphs(book_data["pages"])
-
-    json_data = {
-        "src_filename": pdf_path,
-        "title": book_data["title"],
-        "width": book_data["width"],
-        "height": book_data["height"],
-        "page_count": book_data["page_count"],
-        "trans_status_counts": {
-            "none": 0,
-            "auto": 0,
-            "draft": 0,
-            "fixed": 0
-        },
-        "head_styles": style_and_paragraphs["head_styles"],
-        "paragraphs": style_and_paragraphs["paragraphs"]
-    }
-
-    # JSON出力
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(json_data, f, indent=2, ensure_ascii=False)
-    print(f"paragraphsを {json_path} に保存しました。")
+    if pages is not None and os.path.exists(json_path):
+        return reextract_pages(pdf_path, json_path, pages, workers=workers, progress=progress)
 
-    return json_data
+    # PDFの構造抽出。ページ→段落→JSON出力を1ページずつ流し、全体をメモリに持たない
+    print("PDFの解析を開始します...")
+    doc = fitz.open(pdf_path)
+    book_info = get_pdf_info(doc, pdf_path)
+    doc.close()
+
+    pages_iter = iter_pdf_structure(pdf_path, workers=workers)
+    if progress is not None:
+        pages_iter = report_pages(pages_iter, book_info["page_count"], progress)
+    style_dict = {}
+    trans_status_counts = {"none": 0, "auto": 0, "draft": 0, "fixed": 0}
+
+    # 途中で失敗しても既存のJSONを壊さないよう、一時ファイルに書いてから置き換える
+    tmp_path = json_path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("{\n")
+            for key in ("src_filename", "title", "width", "height", "page_count"):
+                f.write(f"  {json.dumps(key)}: {json.dumps(book_info[key], ensure_ascii=False)},\n")
+            f.write('  "paragraphs": [')
+            paragraph_count = 0
+            for p in iter_paragraphs(pages_iter, style_dict):
+                if paragraph_count:
+                    f.write(",")
+                f.write("\n    " + json.dumps(p, indent=2, ensure_ascii=False).replace("\n", "\n    "))
+                trans_status_counts[p["trans_status"]] += 1
+                paragraph_count += 1
+            f.write("\n  ],\n" if paragraph_count else "],\n")
+
+            head_styles = {k: v for k, v in sorted(style_dict.items(), key=lambda x: x[0])}
+            tail = {"trans_status_counts": trans_status_counts, "head_styles": head_styles}
+            f.write(json.dumps(tail, indent=2, ensure_ascii=False)[2:])
+    except BaseException:
+        # 中断（キャンセルを含む）した場合は書きかけの一時ファイルを消す
+        pages_iter.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, json_path)
+    print(f"paragraphs（{paragraph_count}件）を {json_path} に保存しました。")
+
+    # 段落本体は返さず、書き出した内容の概要だけを返す
+    book_info["paragraph_count"] = paragraph_count
+    book_info["trans_status_counts"] = trans_status_counts
+    return book_info
 
 def main():
     if len(sys.argv) < 2:
@@ -62,7 +286,9 @@ def main():
 
     pdf_path = sys.argv[1]
     json_path = sys.argv[2] if len(sys.argv) > 2 else None
-    extract_paragraphs(pdf_path, json_path)
+    # 3番目の引数でページ範囲を指定すると、既存JSONのそのページだけを再抽出する（例: 3,5-7）
+    pages = parse_page_ranges(sys.argv[3]) if len(sys.argv) > 3 else None
+    extract_paragraphs(pdf_path, json_path, pages=pages)
 
 if __name__ == "__main__":
     main()
@@ -8,67 +8,202 @@ parapara形式ファイルを指定ページ範囲内で翻訳する。
 
 import html
 import json
+import os
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
-from api_translate import translate_text  # 翻訳関数は別ファイルで定義済み
+from dotenv import load_dotenv
+
+from api_translate import translate_texts, get_batch_limits, TRANSLATOR  # 翻訳関数は別ファイルで定義済み
+from parapara_trans_memory import get_translation_memory, normalize_segment
 
 def save_json(data, filepath):
     """
     JSONデータを指定ファイルに保存する。
+    一時ファイルに書いてから置き換えるので、途中で中断しても元のファイルは壊れない。
     """
-    with open(filepath, 'w', encoding='utf-8') as f:
+    tmp_path = filepath + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, filepath)
+
+# 同時に翻訳APIへ送るグループ数の既定値（.env の TRANS_CONCURRENCY で変更できる）
+load_dotenv()
+DEFAULT_CONCURRENCY = int(os.getenv("TRANS_CONCURRENCY", "4"))
+
+# 翻訳中にJSON全体を保存する間隔（グループ数と秒数のどちらかに達したら保存する）
+# 保存の間に反映した翻訳はジャーナルに追記しているので、中断しても失われない
+CHECKPOINT_GROUPS = 200
+CHECKPOINT_SECONDS = 300
+
+# ジャーナルに記録する段落の項目
+JOURNAL_KEYS = ("trans_auto", "trans_text", "trans_status", "modified_at")
+
+def journal_path(filepath):
+    """
+    翻訳ジャーナル（反映した翻訳を1行1段落で追記するファイル）のパスを返す。
+    """
+    return filepath + ".journal"
+
+def append_journal(journal, paragraphs):
+    """
+    反映した段落の翻訳結果をジャーナルに追記する。
+    翻訳した原文（src_replaced）も記録し、復元時に段落が変わっていないかを確かめられるようにする。
+    """
+    for para in paragraphs:
+        entry = {"id": para["id"], "src_replaced": para.get("src_replaced")}
+        for key in JOURNAL_KEYS:
+            entry[key] = para.get(key)
+        journal.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    journal.flush()
+
+def replay_journal(filepath, book_data):
+    """
+    前回中断した翻訳のジャーナルが残っていれば book_data に反映し、反映した段落数を返す。
+    書き込み途中で切れた最終行は無視する。
+    翻訳するのは未翻訳（trans_status が none）の段落だけなので、中断後に画面で編集された段落
+    （trans_status が none でない、または src_replaced が変わった段落）には反映しない。
+    """
+    path = journal_path(filepath)
+    if not os.path.exists(path):
+        return 0
+    para_by_id = {str(p["id"]): p for p in book_data.get("paragraphs", [])}
+    count = 0
+    skipped = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                print("Warning: ジャーナルの不完全な行を無視します。")
+                continue
+            para = para_by_id.get(str(entry.get("id")))
+            if para is None:
+                continue
+            if para.get("trans_status") != "none" or para.get("src_replaced") != entry.get("src_replaced"):
+                skipped += 1
+                continue
+            for key in JOURNAL_KEYS:
+                para[key] = entry[key]
+            count += 1
+    if skipped:
+        print(f"ジャーナルの {skipped} 件は、中断後に段落が変更されているため反映しません。")
+    return count
+
+def remove_journal(filepath):
+    """
+    JSONへの保存が済んだジャーナルを削除する。
+    """
+    path = journal_path(filepath)
+    if os.path.exists(path):
+        os.remove(path)
+
+def clean_translation(translated_content):
+    """
+    訳文から q_ と _q の囲みを除去する。
+    """
+    # q_ と _q が前後に区切り文字（英数字以外、または行頭・行末）の場合にのみ除去する
+    return re.sub(
+        r'(?:(?<=^)|(?<=[^A-Za-z]))q_([A-Za-z]+)_q(?=$|[^A-Za-z])',
+        r'\1',
+        translated_content
+    )
 
-def process_group(paragraphs_group, data, filepath):
+def set_translation(para, translated_content):
     """
-    1. 指定グループの各段落の src_replaced の先頭に【id】を付与して連結し、5000文字以内となる翻訳前テキストを作成
-    2. 翻訳関数 translate_text を呼び出し、翻訳結果を取得
-    3. 翻訳結果から各部の id と翻訳文を抽出し、該当するパラグラフに trans_auto をセットする
+    パラグラフに訳文をセットする
        - trans_status が "none" の場合、"auto" に変更
        - modified_at を現在時刻に更新
-    4. 翻訳結果を反映した JSON データをファイルへ保存する
     """
-    # 各段落のテキストを生成（src_replacedをHTMLエスケープ）
-    texts = [f"【{para['id']}】{html.escape(para['src_replaced'])}" for para in paragraphs_group]
-    concatenated_text = "".join(texts)
-    # concatenated_textの最初の50文字をコンソールに出力
-    print("FOR DEBUG(LEFT50/1TRANS):" + concatenated_text[:50])
+    para['trans_auto'] = translated_content
+    para['trans_text'] = translated_content
+    if para.get('trans_status') == 'none':
+        para['trans_status'] = 'auto'
+    para['modified_at'] = datetime.now().isoformat()
 
-    try:
-        translated_text = translate_text(concatenated_text, source="en", target="ja")
-    except Exception as e:
-        print(f"Error: 翻訳APIの呼び出しに失敗しました: {e}")
-        return
-    
-    # 翻訳結果を【id】のパターンで分割
-    parts = re.split(r'(?=【\d+】)', translated_text)
-    
-    # 各段落を id をキーにした辞書にする
-    para_by_id = { str(para['id']): para for para in paragraphs_group }
-    
-    # 翻訳結果をパターンマッチで抽出し、対応するパラグラフにセットする
-    for part in parts:
-        m = re.match(r'【(\d+)】(.*)', part, re.DOTALL)
-        if m:
-            para_id, translated_content = m.group(1), m.group(2)
-            # q_ と _q が前後に区切り文字（英数字以外、または行頭・行末）の場合にのみ除去する
-            translated_content = re.sub(
-                r'(?:(?<=^)|(?<=[^A-Za-z]))q_([A-Za-z]+)_q(?=$|[^A-Za-z])',
-                r'\1',
-                translated_content
-            )
-            if para_id in para_by_id:
-                para = para_by_id[para_id]
-                para['trans_auto'] = translated_content
-                para['trans_text'] = translated_content
-                if para.get('trans_status') == 'none':
-                    para['trans_status'] = 'auto'
-                para['modified_at'] = datetime.now().isoformat()
-            else:
-                print(f"Warning: 翻訳結果のid {para_id} に対応する段落が見つかりません。")
+def apply_translations(paragraphs_group, translations):
+    """
+    翻訳APIが返した訳文のリストを、送った段落に順番どおりにセットする。
+    戻り値: 翻訳を反映した段落のリスト
+    """
+    if len(translations) != len(paragraphs_group):
+        print(f"Warning: 翻訳結果の件数 {len(translations)} が送信した段落数 {len(paragraphs_group)} と一致しません。")
+        return []
+    for para, translated_content in zip(paragraphs_group, translations):
+        set_translation(para, clean_translation(translated_content))
+    return list(paragraphs_group)
+
+def send_group(paragraphs_group, translator):
+    """
+    グループの各段落の src_replaced をHTMLエスケープし、段落ごとのテキストのリストとして翻訳APIに送る。
+    戻り値: 訳文のリスト（送った段落と同じ順番）
+    """
+    texts = [memory_segment(para) for para in paragraphs_group]
+    # 最初の段落の先頭50文字をコンソールに出力
+    print(f"FOR DEBUG(LEFT50/{len(texts)}TRANS):" + texts[0][:50])
+    return translator(texts, source="en", target="ja")
+
+def backend_name(translator):
+    """
+    翻訳メモリのキーに使う翻訳サービス名。差し替えた翻訳関数は別のサービスとして扱う。
+    """
+    if translator is None or translator is translate_texts:
+        return TRANSLATOR
+    return f"custom:{getattr(translator, '__module__', '')}.{getattr(translator, '__qualname__', repr(translator))}"
+
+def memory_segment(para):
+    """
+    翻訳メモリに登録する原文（翻訳APIに送る1段落分のテキスト）。
+    """
+    return html.escape(para['src_replaced'])
+
+def lookup_memory(paragraphs_group, memory, backend):
+    """
+    翻訳メモリにある段落には訳文をセットし、(セットした段落のリスト, 未登録の段落のリスト) を返す。
+    """
+    hits = []
+    misses = []
+    for para in paragraphs_group:
+        translation = memory.get(memory_segment(para), "en", "ja", backend)
+        if translation is None:
+            misses.append(para)
         else:
-            print("Warning: 翻訳結果の形式が不正です。")
+            set_translation(para, translation)
+            hits.append(para)
+    return hits, misses
+
+def seed_memory_from_books(folder, memory, backend, exclude=None):
+    """
+    folder 内の他の本のJSONから、自動翻訳のままの（trans_status が auto の）段落の trans_auto を翻訳メモリに登録する。
+    辞書置換をやり直したときに未翻訳へ戻るのは auto の段落だけで、draft/fixed の段落の trans_auto は
+    今の src_replaced を翻訳したものとは限らないので登録しない。
+    既に登録済みの原文は上書きしない。登録した件数を返す。
+    """
+    items = []
+    for fname in sorted(os.listdir(folder)):
+        path = os.path.join(folder, fname)
+        if not fname.lower().endswith(".json") or (exclude and os.path.abspath(path) == os.path.abspath(exclude)):
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not isinstance(data, dict):
+            continue
+        for p in data.get("paragraphs", []):
+            if p.get("trans_status") == "auto" and p.get("trans_auto") and "src_replaced" in p:
+                items.append((memory_segment(p), p["trans_auto"]))
+    memory.put_many(items, "en", "ja", backend, overwrite=False)
+    return len(items)
+
+def store_memory(paragraphs, memory, backend):
+    """
+    翻訳APIから得た段落の訳文を翻訳メモリに登録する。
+    """
+    memory.put_many([(memory_segment(p), p['trans_auto']) for p in paragraphs], "en", "ja", backend)
 
 def recalc_trans_status_counts(data):
     """
@@ -81,12 +216,19 @@ def recalc_trans_status_counts(data):
             counts[status] += 1
     data["trans_status_counts"] = counts
 
-def paraparatrans_json_file(filepath, start_page, end_page):
+def paraparatrans_json_file(filepath, start_page, end_page, concurrency=None, translator=None, memory=None, cross_book_folder=None, progress=None):
     """
     JSONファイルを読み込み、指定したページ範囲内の段落について翻訳処理を行い、結果をファイルへ保存する。
     ・filepath: JSONファイルのパス
     ・start_page, end_page: ページ範囲（両端を含む）
-    各グループは5000文字以内に収まるように連結して翻訳される。
+    ・concurrency: 同時に翻訳APIへ送るグループ数（省略時は DEFAULT_CONCURRENCY）
+    ・translator: 翻訳関数（省略時は translate_texts）。テキストのリストを受け取り、訳文のリストを返す
+    ・memory: 翻訳メモリ（省略時は共有の翻訳メモリ）
+    ・cross_book_folder: 指定すると、そのフォルダの他の本の翻訳済み段落を翻訳メモリに取り込んでから翻訳する
+    ・progress: 指定すると、リクエストが終わるごとに progress(完了数, リクエスト数, 送信した文字数) を呼ぶ
+    途中で例外（キャンセルを含む）が起きても、それまでの翻訳を保存してから送出する。
+    段落はページをまたいで、翻訳サービスの1リクエストの上限まで詰めて翻訳される。
+    同じ原文の段落は1回だけ翻訳し、結果を他の段落にも反映する。
     """
     print(f"翻訳処理を開始します: {filepath} ({start_page} 〜 {end_page} ページ)")
 
@@ -94,52 +236,201 @@ def paraparatrans_json_file(filepath, start_page, end_page):
     with open(filepath, 'r', encoding='utf-8') as f:
         book_data = json.load(f)
 
-    # start_pageからend_pageをループしてpagetransを実行
-    for page in range(start_page, end_page + 1):
-        pagetrans(filepath, book_data, page)
+    # 前回中断した翻訳があれば、ジャーナルから復元する（復元した段落は翻訳済みになる）
+    recovered = replay_journal(filepath, book_data)
+    if recovered:
+        print(f"前回中断した翻訳 {recovered} 件をジャーナルから復元しました。")
+
+    memory = memory or get_translation_memory()
+    if cross_book_folder:
+        seeded = seed_memory_from_books(cross_book_folder, memory, backend_name(translator), exclude=filepath)
+        print(f"他の本の翻訳済み段落 {seeded} 件を翻訳メモリに取り込みました。")
 
-    # 翻訳ステータスの集計を更新
-    recalc_trans_status_counts(book_data)
-    save_json(book_data, filepath)
+    # start_pageからend_pageまでの段落をまとめて並列に翻訳する
+    paragraphs, duplicates = collect_untranslated(book_data, range(start_page, end_page + 1))
+    try:
+        stats = translate_paragraphs(filepath, book_data, paragraphs, concurrency, translator, memory, duplicates, progress)
+    finally:
+        # 翻訳ステータスの集計を更新
+        recalc_trans_status_counts(book_data)
+        save_json(book_data, filepath)
+        remove_journal(filepath)
+    print_saving_report(stats)
+    print(f"翻訳メモリ: {memory.get_stats()}")
     
     return book_data
 
-def pagetrans(filepath, book_data, page):
+def collect_untranslated(book_data, pages):
     """
-    各グループは5000文字以内に収まるように連結して翻訳され、各グループ処理後に必ずファイルへ保存する。
+    指定ページの未翻訳パラグラフを page と order でソートして返す。
+    同じ原文の段落は最初の1つだけを返し、残りは duplicates[最初の段落のid] に入れる。
+    戻り値: (段落のリスト, duplicates)
     """
-    print(f"ページ {page} の翻訳を開始します...")
+    pages = set(pages)
     paragraphs = book_data.get("paragraphs", [])
     
     # 指定されたページ範囲と未翻訳パラグラフで抽出し、page と order でソート
     filtered_paragraphs = [
         p for p in paragraphs 
-        if page == p.get("page", 0) 
+        if p.get("page", 0) in pages
         and p.get("trans_status") == "none" 
         and p.get("block_tag") not in ("header", "footer")
     ]
 
     filtered_paragraphs.sort(key=lambda p: (p.get("page", 0), p.get("order", 0)))
 
-    current_group = []
-    current_length = 0
-    # 5000文字を上限にグループ化して翻訳処理を実施
+    # 正規化した原文 -> 最初の段落
+    seen = {}
+    duplicates = {}
+    unique_paragraphs = []
     for para in filtered_paragraphs:
-        text_to_add = f"【{para['id']}】{para['src_replaced']}"
-        if current_length + len(text_to_add) > 5000:
-            if current_group:
-                process_group(current_group, book_data, filepath)
-                current_group = []
-                current_length = 0
-        current_group.append(para)
-        current_length += len(text_to_add)
+        key = normalize_segment(memory_segment(para))
+        first = seen.setdefault(key, para)
+        if first is para:
+            unique_paragraphs.append(para)
+        else:
+            duplicates.setdefault(str(first['id']), []).append(para)
+    return unique_paragraphs, duplicates
+
+def pack_batches(paragraphs, limits, segment=memory_segment):
+    """
+    段落を並び順のまま、1リクエストの上限（文字数・バイト数・段落数）に収まるように詰めて分割する。
+    大きさは実際に送るテキスト（HTMLエスケープ後のテキスト）で測る。
+    並び順を保ったまま連続した区間に分ける場合、上限まで詰める貪欲法でリクエスト数は最小になる。
+    1段落だけで上限を超える場合は、その段落だけで1リクエストにする。
+    limits: {"max_chars": 文字数, "max_bytes": UTF-8のバイト数, "max_segments": 段落数}
+    segment: 要素から送るテキストを得る関数（辞書の語句など、段落以外を詰める場合に差し替える）
+    """
+    batches = []
+    current = []
+    current_chars = 0
+    current_bytes = 0
+    for para in paragraphs:
+        text = segment(para)
+        chars = len(text)
+        size = len(text.encode("utf-8"))
+        if current and (
+            current_chars + chars > limits["max_chars"]
+            or current_bytes + size > limits["max_bytes"]
+            or len(current) >= limits["max_segments"]
+        ):
+            batches.append(current)
+            current = []
+            current_chars = 0
+            current_bytes = 0
+        current.append(para)
+        current_chars += chars
+        current_bytes += size
     
-    # 残ったグループがあれば処理
-    if current_group:
-        process_group(current_group, book_data, filepath)
+    # 残ったグループがあれば追加
+    if current:
+        batches.append(current)
+    return batches
+
+def fan_out(paragraphs, duplicates):
+    """
+    訳文をセットした段落と同じ原文の段落に、同じ訳文をセットする。セットした段落のリストを返す。
+    """
+    copied = []
+    for para in paragraphs:
+        for dup in duplicates.get(str(para['id']), []):
+            set_translation(dup, para['trans_auto'])
+            copied.append(dup)
+    return copied
+
+def print_saving_report(stats):
+    """
+    翻訳APIに送った文字数と、重複排除・翻訳メモリで送らずに済んだ文字数を表示する。
+    """
+    print(
+        f"翻訳APIに送信: {stats['requests']} リクエスト / {stats['api_paragraphs']} 段落 / {stats['api_chars']} 文字、"
+        f"重複排除で節約: {stats['dedup_paragraphs']} 段落 / {stats['dedup_chars']} 文字、"
+        f"翻訳メモリで節約: {stats['memory_paragraphs']} 段落 / {stats['memory_chars']} 文字"
+    )
+
+def translate_paragraphs(filepath, book_data, paragraphs, concurrency=None, translator=None, memory=None, duplicates=None, progress=None):
+    """
+    段落を翻訳する。
+    1. 翻訳メモリにある段落は送らずに訳文をセットする
+    2. 残りを pack_batches で翻訳サービスの上限まで詰め、最大 concurrency 件まで同時に翻訳APIへ送る
+    3. 翻訳結果はメインスレッドで段落 id をもとに反映し、ジャーナルに追記し、翻訳メモリに登録する
+    duplicates: 段落id -> 同じ原文の段落のリスト。訳文をセットしたら同じ訳文をセットする。
+    progress: 指定すると、リクエストが終わるごとに progress(完了数, リクエスト数, 送信した文字数) を呼ぶ。
+              progress が例外を送出した場合は、まだ送っていないリクエストを取り消して送出する。
+    JSON全体の保存は CHECKPOINT_GROUPS グループごと、または CHECKPOINT_SECONDS 秒ごとに行い、
+    最後の保存は呼び出し側で行う（保存後に remove_journal を呼ぶ）。
+    戻り値: リクエスト数、送信した文字数と節約した文字数（原文の文字数）の集計
+    """
+    memory = memory or get_translation_memory()
+    duplicates = duplicates or {}
+    backend = backend_name(translator)
+    limits = get_batch_limits(None if translator is None else backend)
+    translator = translator or translate_texts
+    if concurrency is None:
+        concurrency = DEFAULT_CONCURRENCY
+    concurrency = max(1, concurrency)
+
+    def count_chars(paragraphs):
+        return sum(len(memory_segment(p)) for p in paragraphs)
+
+    stats = {
+        "requests": 0,
+        "api_paragraphs": 0, "api_chars": 0,
+        "memory_paragraphs": 0, "memory_chars": 0,
+        "dedup_paragraphs": 0, "dedup_chars": 0,
+    }
+    for dups in duplicates.values():
+        stats["dedup_paragraphs"] += len(dups)
+        stats["dedup_chars"] += count_chars(dups)
+
+    groups_since_checkpoint = 0
+    last_checkpoint = time.monotonic()
+
+    with open(journal_path(filepath), "a", encoding="utf-8") as journal, \
+            ThreadPoolExecutor(max_workers=concurrency) as executor:
+        hits, misses = lookup_memory(paragraphs, memory, backend)
+        append_journal(journal, hits + fan_out(hits, duplicates))
+        stats["memory_paragraphs"] = len(hits)
+        stats["memory_chars"] = count_chars(hits)
+
+        batches = pack_batches(misses, limits)
+        stats["requests"] = len(batches)
+        stats["api_paragraphs"] = len(misses)
+        stats["api_chars"] = count_chars(misses)
+
+        futures = {executor.submit(send_group, group, translator): group for group in batches}
+        try:
+            if progress is not None:
+                progress(0, len(batches))
+            for done, future in enumerate(as_completed(futures), 1):
+                group = futures[future]
+                try:
+                    translations = future.result()
+                except Exception as e:
+                    print(f"Error: 翻訳APIの呼び出しに失敗しました: {e}")
+                else:
+                    updated = apply_translations(group, translations)
+                    append_journal(journal, updated + fan_out(updated, duplicates))
+                    store_memory(updated, memory, backend)
+                print(f"翻訳 {done}/{len(batches)} リクエスト完了")
+
+                groups_since_checkpoint += 1
+                if groups_since_checkpoint >= CHECKPOINT_GROUPS or time.monotonic() - last_checkpoint >= CHECKPOINT_SECONDS:
+                    # 保存してからジャーナルを空にする。間で中断しても再反映は同じ結果になる
+                    save_json(book_data, filepath)
+                    journal.seek(0)
+                    journal.truncate()
+                    groups_since_checkpoint = 0
+                    last_checkpoint = time.monotonic()
+
+                if progress is not None:
+                    progress(done, len(batches), count_chars(group))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
 
-    save_json(book_data, filepath)    
-    print(f"ページ {page} の翻訳が完了しました。")
+    return stats
 
 if __name__ == '__main__':
     import argparse
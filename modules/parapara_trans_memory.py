@@ -0,0 +1,154 @@
+"""
+翻訳メモリ。翻訳済みの原文と訳文を SQLite に保存し、同じ原文を翻訳APIへ再送しないようにする。
+
+・キーは 翻訳サービス名・言語ペア・正規化した原文 のハッシュ。
+・よく使うエントリはメモリ上の LRU キャッシュに保持する。
+・ヒット/ミス数を集計する。
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+load_dotenv()
+# 翻訳メモリのファイル（.env の TRANSLATION_MEMORY_PATH で変更できる）
+DEFAULT_MEMORY_PATH = os.getenv("TRANSLATION_MEMORY_PATH", os.path.join("data", "translation_memory.db"))
+# メモリ上に保持するエントリ数
+DEFAULT_CACHE_SIZE = 10000
+
+
+def normalize_segment(text):
+    """
+    原文を正規化する。Unicode を NFC にそろえ、連続する空白を1つにして前後の空白を除く。
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def make_key(backend, source, target, text):
+    """
+    翻訳サービス名・言語ペア・正規化した原文からキーを作る。
+    """
+    material = "\0".join([backend.lower(), source.lower(), target.lower(), normalize_segment(text)])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class TranslationMemory:
+    """
+    SQLite に保存する翻訳メモリ。複数スレッドから使える。
+    """
+
+    def __init__(self, db_path=DEFAULT_MEMORY_PATH, cache_size=DEFAULT_CACHE_SIZE):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stored": 0}
+
+        folder = os.path.dirname(db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS translations (
+                key TEXT PRIMARY KEY,
+                backend TEXT,
+                source_lang TEXT,
+                target_lang TEXT,
+                source_text TEXT,
+                translated_text TEXT,
+                created_at TEXT
+            )
+            """
+        )
+        self._conn.commit()
+
+    def _remember(self, key, translation):
+        self._cache[key] = translation
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def get(self, text, source, target, backend):
+        """
+        訳文を返す。登録されていなければ None。
+        """
+        key = make_key(backend, source, target, text)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return self._cache[key]
+            row = self._conn.execute(
+                "SELECT translated_text FROM translations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["db_hits"] += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def put_many(self, items, source, target, backend, overwrite=True):
+        """
+        (原文, 訳文) のリストを1回のトランザクションで登録する。
+        overwrite が False の場合、登録済みの原文は変更しない。
+        """
+        now = datetime.now().isoformat()
+        rows = []
+        for text, translation in items:
+            key = make_key(backend, source, target, text)
+            rows.append((key, backend, source, target, normalize_segment(text), translation, now))
+        if not rows:
+            return
+        with self._lock:
+            if overwrite:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+                )
+                for row in rows:
+                    self._remember(row[0], row[5])
+            else:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO translations VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+                )
+            self._conn.commit()
+            self._stats["stored"] += len(rows)
+
+    def put(self, text, translation, source, target, backend):
+        """
+        訳文を1件登録する。
+        """
+        self.put_many([(text, translation)], source, target, backend)
+
+    def get_stats(self):
+        """
+        ヒット/ミス数とヒット率を返す。
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cached_entries"] = len(self._cache)
+        lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["db_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def get_translation_memory():
+    """
+    プロセス全体で共有する翻訳メモリを返す。
+    """
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            _memory = TranslationMemory()
+        return _memory
@@ -1,10 +1,12 @@
-from flask import Flask, request, render_template, redirect, url_for, send_from_directory, jsonify, send_file
+from flask import Flask, request, render_template, redirect, url_for, send_from_directory, jsonify, send_file, Response, stream_with_context
 import os
 import json
 import datetime
 import io
 import logging
+import multiprocessing
 import sys
+import time
 from PyPDF2 import PdfReader, PdfWriter
 
 # .envのひな形
@@ -17,6 +19,15 @@ TRANSLATOR=google
 
 GOOGLE_API_KEY=YOUR_GOOGLE_API_KEY
 DEEPL_AUTH_KEY=YOUR_DEEPL_AUTH_KEY
+
+# 同時に翻訳APIへ送るリクエスト数
+TRANS_CONCURRENCY=4
+
+# 同時に実行するバックグラウンド処理（全翻訳、パラグラフ抽出など）の数
+JOB_WORKERS=2
+
+# 1分あたりに翻訳APIへ送る文字数の上限（省略時は翻訳サービスごとの既定値）
+# TRANS_CHARS_PER_MINUTE=6000000
 """
 
 # .envが存在しない場合にひな形を出力
@@ -28,15 +39,21 @@ if not os.path.exists(ENV_PATH):
 
 # modulesディレクトリをPythonのモジュール検索パスに追加
 sys.path.append(os.path.join(os.path.dirname(__file__), 'modules'))
-from modules.parapara_pdf2json import extract_paragraphs
-from modules.api_translate import translate_text
+from modules.parapara_pdf2json import extract_paragraphs, parse_page_ranges
+# api_translate は parapara_trans などと同じく modules を検索パスにして読み込む。
+# modules.api_translate として読み込むと別のモジュールになり、流量制限と使用量の記録が共有されない
+from api_translate import translate_text, get_usage_stats, RateLimitError
 from modules.parapara_trans import paraparatrans_json_file
-from modules.parapara_dict_replacer import file_replace_with_dict
+from modules.parapara_dict_replacer import apply_dict_to_book
 from modules.parapara_json2html import json2html
 from modules.parapara_tagging_headerfooter import headerfooter_tagging
 from modules.parapara_tagging_by_structure import structure_tagging
-from modules.parapara_dict_create import dict_create
+from modules.parapara_dict_create import dict_create, dict_create_corpus, get_occurrence_index
 from modules.parapara_dict_trans import dict_trans
+from modules.parapara_book_store import book_store
+# 翻訳メモリも parapara_trans / parapara_dict_trans と同じモジュールから取得する（同じインスタンスを共有する）
+from parapara_trans_memory import get_translation_memory
+from modules.parapara_jobs import job_manager, BookBusyError
 
 app = Flask(__name__, template_folder="templates", static_folder="static")
 
@@ -81,6 +98,36 @@ def get_paths(pdf_name):
     json_path = os.path.join(BASE_FOLDER, pdf_name + ".json")
     return pdf_path, json_path
 
+def submit_job(kind, keys, func, unit="件"):
+    """
+    func(progress) をバックグラウンドのジョブとして投入し、ジョブIDを返すレスポンスを作る。
+    keys のファイルを他のジョブが使用中なら 409 を返す。
+    """
+    try:
+        job = job_manager.submit(kind, keys, func, unit)
+    except BookBusyError as e:
+        return jsonify({"status": "error", "message": f"処理中のジョブがあります: {str(e)}"}), 409
+    return jsonify({"status": "ok", "job_id": job.id, "message": f"{kind} を開始しました"}), 202
+
+def busy_response(json_path):
+    """
+    json_path をジョブが処理中なら 409 のレスポンスを返す。処理中でなければ None。
+    ジョブの結果とブラウザからの保存が上書きし合わないよう、保存系のAPIの先頭で呼ぶ。
+    """
+    if job_manager.is_busy(json_path):
+        return jsonify({"status": "error", "message": "処理中のジョブがあるため保存できません。完了後に再度保存してください。"}), 409
+    return None
+
+def saved_response(json_path, payload):
+    """
+    保存系のAPIの成功レスポンスを作る。ファイルへの書き出しに失敗して再試行中なら save_error を含める
+    （変更はメモリ上にはあるが、まだファイルに保存されていない）。
+    """
+    save_error = book_store.save_error(json_path)
+    if save_error:
+        payload["save_error"] = save_error
+    return jsonify(payload), 200
+
 @app.context_processor
 def utility_processor():
     def enumerate_filter(iterable):
@@ -139,22 +186,22 @@ def detail(pdf_name, page_number=1):
     pdf_path, json_path = get_paths(pdf_name)
 
     if os.path.exists(json_path):
-        with open(json_path, "r", encoding="utf-8") as f:
-            book_data = json.load(f)
-    else:
-        book_data = {
-            "src_filename": pdf_name,
-            "title": pdf_name,
-            "width": 600,
-            "height": 800,
-            "head_styles": {},
-            "trans_status_counts": {"pending": 0, "auto": 0, "manual": 0, "fixed": 0},
-            "paragraphs": []
-        }
+        updated_date = datetime.datetime.fromtimestamp(os.path.getmtime(json_path)).strftime("%Y/%m/%d")
+        # 共有している book_data を描画中に他のリクエストやジョブが変更しないよう、ロックを保持して描画する
+        with book_store.locked(json_path) as book_data:
+            return render_template("detail.html", pdf_name=pdf_name, page_number=page_number, book_data=book_data, updated_date=updated_date)
+
+    book_data = {
+        "src_filename": pdf_name,
+        "title": pdf_name,
+        "width": 600,
+        "height": 800,
+        "head_styles": {},
+        "trans_status_counts": {"pending": 0, "auto": 0, "manual": 0, "fixed": 0},
+        "paragraphs": []
+    }
 
     updated_date = datetime.datetime.fromtimestamp(os.path.getmtime(pdf_path)).strftime("%Y/%m/%d")
-    if os.path.exists(json_path):
-        updated_date = datetime.datetime.fromtimestamp(os.path.getmtime(json_path)).strftime("%Y/%m/%d")
 
     return render_template("detail.html", pdf_name=pdf_name, page_number=page_number, book_data=book_data, updated_date=updated_date)
 
@@ -164,32 +211,51 @@ def get_book_data(pdf_name):
     pdf_path, json_path = get_paths(pdf_name)
     if not os.path.exists(json_path):
         return jsonify({"status": "error", "message": "JSONが存在しません"}), 400
-    with open(json_path, "r", encoding="utf-8") as f:
-        book_data = json.load(f)
-    return jsonify(book_data)
+    # 他のリクエストやジョブが変更している途中の book_data を返さないよう、ロックを保持して JSON にする
+    with book_store.locked(json_path) as book_data:
+        save_error = book_store.save_error(json_path)
+        if save_error:
+            # 保存に失敗している場合だけ、浅いコピーに save_error を加えて返す
+            return jsonify({**book_data, "save_error": save_error})
+        return jsonify(book_data)
 
 # API:PDFからbook_dataファイル生成
+# pages（例: "3,5-7"）を指定すると、既存のJSONのそのページだけを再抽出してマージする
 @app.route("/api/extract_paragraphs/<pdf_name>", methods=["POST"])
 def create_book_data_api(pdf_name):
     pdf_path, json_path = get_paths(pdf_name)
-    if os.path.exists(json_path):
+    pages_text = request.form.get("pages", "").strip()
+    if os.path.exists(json_path) and not pages_text:
         return jsonify({"status": "ok", "message": "既に抽出済みです"}), 200
-    book_data = extract_paragraphs(pdf_path)
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(book_data, f, ensure_ascii=False, indent=2)
-    return jsonify({"status": "ok"}), 200
+    try:
+        pages = parse_page_ranges(pages_text) if pages_text else None
+    except ValueError:
+        return jsonify({"status": "error", "message": f"ページ指定が不正です: {pages_text}"}), 400
+    workers = request.form.get("workers", 1, type=int)
+
+    def run(progress):
+        with book_store.external_update(json_path):
+            extract_paragraphs(pdf_path, json_path, workers=workers, pages=pages, progress=progress)
+
+    return submit_job("パラグラフ抽出", [json_path], run, unit="ページ")
 
-# API:ファイル全翻訳
+# API:ファイル全翻訳（バックグラウンドのジョブとして実行する）
 @app.route("/api/translate_all/<pdf_name>", methods=["POST"])
 def translate_all_api(pdf_name):
     pdf_path, json_path = get_paths(pdf_name)
     if not os.path.exists(json_path):
         return jsonify({"status": "error", "message": "JSONが存在しません"}), 400
-    try:
-        paraparatrans_json_file(json_path, 1, 9999)
-    except Exception as e:
-        return jsonify({"status": "error", "message": f"全翻訳エラー: {str(e)}"}), 500
-    return jsonify({"status": "ok"}), 200
+    concurrency = request.form.get("concurrency", type=int)
+    cross_book_folder = BASE_FOLDER if request.form.get("cross_book") == "1" else None
+
+    def run(progress):
+        with book_store.external_update(json_path):
+            book_data = paraparatrans_json_file(
+                json_path, 1, 9999, concurrency=concurrency, cross_book_folder=cross_book_folder, progress=progress
+            )
+        return book_data.get("trans_status_counts")
+
+    return submit_job("全翻訳", [json_path], run, unit="リクエスト")
 
 # API:短文翻訳
 @app.route("/api/translate", methods=["POST"])
@@ -202,7 +268,10 @@ def translate_api():
     print(json.dumps(data, indent=2, ensure_ascii=False))
 
     text = data["text"]
-    translation = translate_text(text, source="en", target="ja")
+    try:
+        translation = translate_text(text, source="en", target="ja")
+    except RateLimitError as e:
+        return jsonify({"status": "error", "message": f"翻訳APIの流量制限に達しました: {str(e)}"}), 429
     return jsonify({"status": "ok", "translation": translation}), 200
 
 # API:構造ファイル保存
@@ -215,15 +284,78 @@ def save_structure_api(pdf_name):
     title = request.form.get("title")
     if not paragraphs_json:
         return jsonify({"status": "error", "message": "paragraphs がありません"}), 400
-    with open(json_path, "r", encoding="utf-8") as f:
-        book_data = json.load(f)
     new_paragraphs = json.loads(paragraphs_json)
-    book_data["paragraphs"] = new_paragraphs
-    if title is not None:
-        book_data["title"] = title
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(book_data, f, ensure_ascii=False, indent=2)
-    return jsonify({"status": "ok"}), 200
+    busy = busy_response(json_path)
+    if busy:
+        return busy
+    with book_store.edit(json_path) as book_data:
+        book_data["paragraphs"] = new_paragraphs
+        if title is not None:
+            book_data["title"] = title
+    return saved_response(json_path, {"status": "ok", "version": book_data["version"]})
+
+# パッチで変更できるパラグラフの項目
+PATCHABLE_FIELDS = {
+    "page", "order", "src_text", "src_replaced", "trans_auto", "trans_text",
+    "trans_status", "block_tag", "parent_id", "comments",
+}
+
+# API:変更があったパラグラフの項目だけを保存する
+# {"version": 取得時のversion, "title": 任意, "changes": [{"id": 段落id, "fields": {項目: 値}}]}
+# version が一致しない場合は他で更新されているので 409 を返す
+@app.route("/api/patch_paragraphs/<pdf_name>", methods=["POST"])
+def patch_paragraphs_api(pdf_name):
+    pdf_path, json_path = get_paths(pdf_name)
+    if not os.path.exists(json_path):
+        return jsonify({"status": "error", "message": "JSONが存在しません"}), 400
+    data = request.get_json(silent=True)
+    if not data or "version" not in data:
+        return jsonify({"status": "error", "message": "version がありません"}), 400
+    changes = data.get("changes", [])
+    title = data.get("title")
+    busy = busy_response(json_path)
+    if busy:
+        return busy
+
+    # 検証と適用の間に他の更新が入らないよう、ストアのロック内で行う
+    with book_store.locked(json_path) as book_data:
+        current_version = book_data.get("version", 0)
+        if data["version"] != current_version:
+            return jsonify({
+                "status": "conflict",
+                "message": "他で更新されています。再読み込みしてください。",
+                "version": current_version,
+            }), 409
+
+        paragraph_by_id = book_store.paragraph_index(json_path)
+        targets = []
+        for change in changes:
+            p = paragraph_by_id.get(str(change.get("id")))
+            if p is None:
+                return jsonify({"status": "error", "message": f"該当パラグラフが見つかりません: {change.get('id')}"}), 404
+            fields = change.get("fields", {})
+            unknown = set(fields) - PATCHABLE_FIELDS
+            if unknown:
+                return jsonify({"status": "error", "message": f"変更できない項目です: {', '.join(sorted(unknown))}"}), 400
+            targets.append((p, fields))
+
+        now = datetime.datetime.now().isoformat()
+        status_changed = False
+        for p, fields in targets:
+            p.update(fields)
+            p["modified_at"] = now
+            status_changed = status_changed or "trans_status" in fields
+        if title is not None:
+            book_data["title"] = title
+        if status_changed:
+            recalc_trans_status_counts(book_data)
+        book_store.mark_dirty(json_path)
+
+    return saved_response(json_path, {
+        "status": "ok",
+        "version": book_data["version"],
+        "trans_status_counts": book_data.get("trans_status_counts", {}),
+    })
 
 # パラグラフの翻訳を保存するAPI
 @app.route("/api/export_html/<pdf_name>", methods=["POST"])
@@ -232,7 +364,8 @@ def export_html_api(pdf_name):
     if not os.path.exists(json_path):
         return jsonify({"status": "error", "message": "JSONが存在しません"}), 400
     try:
-        json2html(json_path)
+        with book_store.external_update(json_path):
+            json2html(json_path)
     except Exception as e:
         return jsonify({"status": "error", "message": f"HTML生成エラー: {str(e)}"}), 500
     return jsonify({"status": "ok"}), 200
@@ -252,26 +385,23 @@ def update_paragraph_api(pdf_name):
     pdf_path, json_path = get_paths(pdf_name)
     if not os.path.exists(json_path):
         return jsonify({"status": "error", "message": "JSONが存在しません"}), 400
-    with open(json_path, "r", encoding="utf-8") as f:
-        book_data = json.load(f)
-
-    found = None
-    for p in book_data["paragraphs"]:
-        if str(p["id"]) == str(paragraph_id):
-            found = p
-            break
-    if found is None:
-        return jsonify({"status": "error", "message": "該当パラグラフが見つかりません"}), 404
-
-    found["src_text"] = new_src_text
-    found["trans_text"] = new_trans_text
-    found["trans_status"] = new_status
-    found["block_tag"] = new_block_tag
-    found["modified_at"] = datetime.datetime.now().isoformat()
-    recalc_trans_status_counts(book_data)
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(book_data, f, ensure_ascii=False, indent=2)
-    return jsonify({"status": "ok"}), 200
+    busy = busy_response(json_path)
+    if busy:
+        return busy
+    # 段落の検索から変更までロックを保持する（間で段落のリストが差し替えられないようにする）
+    with book_store.locked(json_path) as book_data:
+        found = book_store.paragraph_index(json_path).get(str(paragraph_id))
+        if found is None:
+            return jsonify({"status": "error", "message": "該当パラグラフが見つかりません"}), 404
+
+        found["src_text"] = new_src_text
+        found["trans_text"] = new_trans_text
+        found["trans_status"] = new_status
+        found["block_tag"] = new_block_tag
+        found["modified_at"] = datetime.datetime.now().isoformat()
+        recalc_trans_status_counts(book_data)
+        book_store.mark_dirty(json_path)
+    return saved_response(json_path, {"status": "ok", "version": book_data["version"]})
 
 # API:ファイルへの辞書全置換
 @app.route("/api/dict_replace_all/<pdf_name>", methods=["POST"])
@@ -281,16 +411,26 @@ def dict_replace_all_api(pdf_name):
     pdf_path, json_path = get_paths(pdf_name)
     if not os.path.exists(json_path):
         return jsonify({"status": "error", "message": "対象のJSONファイルが存在しません"}), 404
+    # full=1 なら全段落に適用し直す（既定は前回の適用からの差分だけを適用する）
+    full = request.form.get("full") == "1"
     try:
-        file_replace_with_dict(json_path, DICT_PATH)
+        with job_manager.hold([json_path, DICT_PATH]), book_store.locked(json_path) as book_data:
+            result = apply_dict_to_book(book_data, json_path, DICT_PATH, full=full)
+            if result["updated"]:
+                book_store.mark_dirty(json_path)
+    except BookBusyError as e:
+        return jsonify({"status": "error", "message": f"処理中のジョブがあります: {str(e)}"}), 409
     except Exception as e:
         return jsonify({"status": "error", "message": f"辞書適用中のエラー: {str(e)}"}), 500
-    return jsonify({"status": "ok"}), 200
+    return saved_response(json_path, {"status": "ok", **result})
 
 @app.route("/api/paraparatrans/<pdf_name>", methods=["POST"])
 def paraparatrans_api(pdf_name):
     start_page = request.form.get("start_page", type=int)
     end_page = request.form.get("end_page", type=int)
+    concurrency = request.form.get("concurrency", type=int)
+    # cross_book=1 なら、他の本の翻訳済み段落を翻訳メモリに取り込んでから翻訳する
+    cross_book_folder = BASE_FOLDER if request.form.get("cross_book") == "1" else None
     if not pdf_name or start_page is None or end_page is None:
         return jsonify({"status": "error", "message": "pdf_name, start_page, end_page は必須です"}), 400
     pdf_path, json_path = get_paths(pdf_name)
@@ -299,7 +439,13 @@ def paraparatrans_api(pdf_name):
 
     #pythoで数字を文字列に変換する
     print ("json_path:" + json_path + " start_page:" + str(start_page) + " end_page:" + str(end_page))
-    updated_data = paraparatrans_json_file(json_path, start_page, end_page)
+    try:
+        with job_manager.hold([json_path]), book_store.external_update(json_path):
+            updated_data = paraparatrans_json_file(
+                json_path, start_page, end_page, concurrency=concurrency, cross_book_folder=cross_book_folder
+            )
+    except BookBusyError as e:
+        return jsonify({"status": "error", "message": f"処理中のジョブがあります: {str(e)}"}), 409
     return jsonify({"status": "ok", "data": updated_data}), 200
 
 # APIW:book_data取得
@@ -308,9 +454,8 @@ def reload_book_data_api(pdf_name):
     pdf_path, json_path = get_paths(pdf_name)
     if not os.path.exists(json_path):
         return jsonify({"status": "error", "message": "JSONファイルが存在しません"}), 404
-    with open(json_path, "r", encoding="utf-8") as f:
-        book_data = json.load(f)
-    return jsonify(book_data), 200
+    with book_store.locked(json_path) as book_data:
+        return jsonify(book_data), 200
 
 @app.route("/pdf_view/<pdf_name>")
 def pdf_view(pdf_name):
@@ -344,57 +489,150 @@ def save_order_api(pdf_name):
     pdf_path, json_path = get_paths(pdf_name)
     if not os.path.exists(json_path):
         return jsonify({"status": "error", "message": "JSONが存在しません"}), 404
-    with open(json_path, "r", encoding="utf-8") as f:
-        book_data = json.load(f)
     new_order = json.loads(order_json)
-    for item in new_order:
-        p_id = str(item.get("id"))
-        new_order_val = item.get("order")
-        for p in book_data.get("paragraphs", []):
-            if str(p.get("id")) == p_id:
-                p["order"] = new_order_val
-                break
-    if title is not None:
-        book_data["title"] = title
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(book_data, f, ensure_ascii=False, indent=2)
-    return jsonify({"status": "ok"}), 200
+    busy = busy_response(json_path)
+    if busy:
+        return busy
+    with book_store.edit(json_path) as book_data:
+        paragraph_by_id = book_store.paragraph_index(json_path)
+        for item in new_order:
+            p = paragraph_by_id.get(str(item.get("id")))
+            if p is not None:
+                p["order"] = item.get("order")
+        if title is not None:
+            book_data["title"] = title
+    return saved_response(json_path, {"status": "ok", "version": book_data["version"]})
 
 @app.route("/api/auto_tagging/<pdf_name>", methods=["POST"])
 def auto_tagging_api(pdf_name):
     pdf_path, json_path = get_paths(pdf_name)
     if not os.path.exists(json_path):
         return jsonify({"status": "error", "message": "JSONファイルが存在しません"}), 404
-    try:
-        headerfooter_tagging(json_path)
-        structure_tagging(json_path, BASE_FOLDER + "/symbolfonts.txt")
 
-    except Exception as e:
-        return jsonify({"status": "error", "message": f"自動タグ付けエラー: {str(e)}"}), 500
-    return jsonify({"status": "ok", "message": "自動タグ付け完了"}), 200
+    def run(progress):
+        with book_store.external_update(json_path):
+            progress(0, 2)
+            headerfooter_tagging(json_path)
+            progress(1, 2)
+            structure_tagging(json_path, BASE_FOLDER + "/symbolfonts.txt")
+            progress(2, 2)
+
+    return submit_job("自動タグ付け", [json_path], run, unit="工程")
 
 @app.route("/api/dict_create/<pdf_name>", methods=["POST"])
 def dict_create_api(pdf_name):
     pdf_path, json_path = get_paths(pdf_name)
     if not os.path.exists(json_path):
         return jsonify({"status": "error", "message": "JSONファイルが存在しません"}), 404
-    try:
-        dict_create(json_path, DICT_PATH)
-    except Exception as e:
-        return jsonify({"status": "error", "message": f"辞書生成エラー: {str(e)}"}), 500
-    return jsonify({"status": "ok", "message": "辞書生成完了"}), 200
+
+    def run(progress):
+        with book_store.external_update(json_path):
+            dict_create(json_path, DICT_PATH, progress=progress)
+
+    return submit_job("辞書抽出", [json_path, DICT_PATH], run, unit="段落")
+
+# API:BASE_FOLDER のすべての本から辞書を抽出する（前回から変わっていない本は読まない）
+@app.route("/api/dict_create_all", methods=["POST"])
+def dict_create_all_api():
+    workers = request.form.get("workers", type=int)
+    # 編集中の本の未保存の変更を書き出してから読む
+    book_store.flush_all()
+
+    def run(progress):
+        return dict_create_corpus(BASE_FOLDER, DICT_PATH, workers=workers, progress=progress)
+
+    return submit_job("辞書抽出（全書籍）", [DICT_PATH], run, unit="冊")
+
+# API:語句の出現箇所（辞書抽出で作った索引を引く）
+@app.route("/api/dict_occurrences/<pdf_name>", methods=["GET"])
+def dict_occurrences_api(pdf_name):
+    phrase = request.args.get("phrase", "").strip()
+    if not phrase:
+        return jsonify({"status": "error", "message": "phrase は必須です"}), 400
+    pdf_path, json_path = get_paths(pdf_name)
+    book = os.path.basename(json_path)
+    results = get_occurrence_index().find(phrase)
+    for entry in results:
+        entry["pdf_name"] = os.path.splitext(entry["book"])[0]
+    return jsonify({
+        "status": "ok",
+        "phrase": phrase,
+        # この本の出現箇所（辞書抽出をしていなければ null）
+        "book": next((entry for entry in results if entry["book"] == book), None),
+        "books": results,
+    }), 200
 
 @app.route("/api/dict_trans/<pdf_name>", methods=["POST"])
 def dict_trans_api(pdf_name):
     pdf_path, json_path = get_paths(pdf_name)
     if not os.path.exists(json_path):
         return jsonify({"status": "error", "message": "JSONファイルが存在しません"}), 404
-    try:
-        print("DICT_PATH" + DICT_PATH)
-        dict_trans(DICT_PATH)
-    except Exception as e:
-        return jsonify({"status": "error", "message": f"辞書翻訳エラー: {str(e)}"}), 500
-    return jsonify({"status": "ok", "message": "辞書翻訳完了"}), 200
+    print("DICT_PATH" + DICT_PATH)
+
+    def run(progress):
+        dict_trans(DICT_PATH, progress=progress)
+
+    return submit_job("辞書翻訳", [DICT_PATH], run, unit="語句")
+
+# API:ジョブの一覧
+@app.route("/api/jobs", methods=["GET"])
+def jobs_api():
+    return jsonify({"status": "ok", "jobs": [job.to_dict() for job in job_manager.list()]}), 200
+
+# API:ジョブの状態（進捗、送信文字数、残り時間）。ポーリング用
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def job_api(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "ジョブが見つかりません"}), 404
+    return jsonify({"status": "ok", "job": job.to_dict()}), 200
+
+# API:ジョブのキャンセル
+@app.route("/api/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job_api(job_id):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "ジョブが見つかりません"}), 404
+    return jsonify({"status": "ok", "job": job.to_dict()}), 200
+
+# API:ジョブの状態を Server-Sent Events で送る。状態が変わるたびに送り、終了したら閉じる
+@app.route("/api/jobs/<job_id>/events", methods=["GET"])
+def job_events_api(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "ジョブが見つかりません"}), 404
+
+    def stream():
+        last = None
+        last_sent = 0.0
+        while True:
+            state = job.to_dict()
+            # 経過時間と残り時間は毎回変わるので、進捗が変わったときか15秒ごとに送る
+            key = (state["status"], state["done"], state["total"], state["chars"], state["cancel_requested"])
+            if key != last or time.monotonic() - last_sent >= 15:
+                yield f"data: {json.dumps(state, ensure_ascii=False)}\n\n"
+                last = key
+                last_sent = time.monotonic()
+            if state["status"] not in ("queued", "running"):
+                return
+            time.sleep(0.5)
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# API:book_dataキャッシュの統計（ヒット/ミス数、書き出し時間）
+@app.route("/api/book_store_stats", methods=["GET"])
+def book_store_stats_api():
+    return jsonify({"status": "ok", "stats": book_store.get_stats()}), 200
+
+# API:翻訳メモリの統計（ヒット/ミス数、ヒット率）
+@app.route("/api/translation_memory_stats", methods=["GET"])
+def translation_memory_stats_api():
+    return jsonify({"status": "ok", "stats": get_translation_memory().get_stats()}), 200
+
+@app.route("/api/translation_usage", methods=["GET"])
+def translation_usage_api():
+    return jsonify({"status": "ok", "stats": get_usage_stats()}), 200
 
 def recalc_trans_status_counts(book_data):
     counts = {"none": 0, "auto": 0, "draft": 0, "fixed": 0}
@@ -405,5 +643,7 @@ def recalc_trans_status_counts(book_data):
     book_data["trans_status_counts"] = counts
 
 if __name__ == "__main__":
+    # PyInstaller で EXE 化した場合にプロセスプールを使うため
+    multiprocessing.freeze_support()
     app.run(host="0.0.0.0", port=5077, debug=False)
 
@@ -1,7 +1,17 @@
+// サーバーがファイルへの保存に失敗して再試行中なら知らせる（変更はサーバーのメモリ上にだけある）
+function warnSaveError(data) {
+    if (data && data.save_error) {
+        alert('サーバーでファイルへの保存に失敗しています（自動で再試行中）。ディスクの空きや権限を確認してください: ' + data.save_error);
+    }
+}
+
 async function fetchBookData() {
     try {
         let response = await fetch(`/api/book_data/${encodeURIComponent(pdfName)}`);
         bookData = await response.json();
+        warnSaveError(bookData);
+        delete bookData.save_error;
+        snapshotParagraphs();
         
         document.getElementById("titleInput").value = bookData.title;
         document.getElementById("pageCount").innerText = bookData.page_count;
@@ -47,47 +57,23 @@ function transAllPages() {
     const totalPages = bookData.page_count;
     if (!confirm(`全 ${totalPages} ページを翻訳します。よろしいですか？`)) return;
 
-    fetch(`/api/paraparatrans/${encodeURIComponent(pdfName)}`, {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/x-www-form-urlencoded'
-        },
-        body: '&start_page=' + encodeURIComponent(1) +
-            '&end_page=' + encodeURIComponent(totalPages)
-    })
-        .then(response => response.json())
-        .then(data => {
-            if (data.status === "ok") {
-                console.log('翻訳が成功しました。');
-            } else {
-                console.error('エラー:', data.message);
-                alert('翻訳エラー: ' + data.message);
-            }
-        })
-        .catch(error => {
-            console.error('Error:', error);
-            alert('翻訳中にエラーが発生しました。詳細はコンソールを確認してください。');
-        })
-        .finally(() => {
-            // 成功・失敗に関わらず必ず実行
-            fetchBookData();
-        });
+    runJob(`/api/translate_all/${encodeURIComponent(pdfName)}`, null, "全翻訳", () => {
+        fetchBookData();
+    });
 }
 
 function extractParagraphs(){
-    if(!confirm("PDFを解析してJSONを新規生成します。よろしいですか？")) return;
     let form = new FormData();
-    fetch(`/api/extract_paragraphs/${encodeURIComponent(pdfName)}`, {
-        method: "POST",
-        body: form
-    }).then(r => r.json()).then(res => {
-        if(res.status === "ok"){
-            alert("パラグラフ抽出完了");
-            location.reload();
-            fetchBookData();
-        } else {
-            alert(res.message);
-        }
+    if (bookData.paragraphs && bookData.paragraphs.length > 0) {
+        // 抽出済みの場合は指定ページだけを再抽出する（他のページの訳文は維持される）
+        let pages = prompt("再抽出するページを指定してください（例: 3,5-7）", currentPage);
+        if (!pages) return;
+        form.append("pages", pages);
+    } else {
+        if(!confirm("PDFを解析してJSONを新規生成します。よろしいですか？")) return;
+    }
+    runJob(`/api/extract_paragraphs/${encodeURIComponent(pdfName)}`, form, "パラグラフ抽出", () => {
+        location.reload();
     });
 }  
 
@@ -102,7 +88,7 @@ function dictReplaceAll() {
     .then(data => {
         if (data.status === "ok") {
             fetchBookData();
-            alert("全対訳置換が成功しました");
+            alert(`全対訳置換が成功しました（変更された語句 ${data.changed_terms} 件、置換した段落 ${data.paragraphs} 件）`);
         } else {
             console.error("対訳置換エラー:", data.message);
             alert("対訳置換エラー: " + data.message);
@@ -115,105 +101,292 @@ function dictReplaceAll() {
 }
 
 function autoTagging() {
-    fetch(`/api/auto_tagging/${encodeURIComponent(pdfName)}`, {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/x-www-form-urlencoded'
+    runJob(`/api/auto_tagging/${encodeURIComponent(pdfName)}`, null, "自動タグ付け", () => {
+        fetchBookData();
+    });
+}
+
+function dictCreate() {
+    runJob(`/api/dict_create/${encodeURIComponent(pdfName)}`, null, "辞書生成");
+}
+
+function dictCreateAll() {
+    runJob(`/api/dict_create_all`, null, "全書籍の辞書抽出");
+}
+
+function dictTrans() {
+    runJob(`/api/dict_trans/${encodeURIComponent(pdfName)}`, null, "辞書翻訳");
+}
+
+// 語句の出現箇所（検索した語句と、この本の段落のリスト、表示中の位置）
+var termOccurrences = { phrase: null, paragraphs: [], position: -1 };
+
+// 辞書抽出で作った索引から語句の出現箇所を取得し、ボタンを押すたびに次の段落へ移動する
+async function findTermOccurrences() {
+    const phrase = document.getElementById("termInput").value.trim();
+    const status = document.getElementById("termStatus");
+    if (!phrase) return;
+
+    if (phrase !== termOccurrences.phrase) {
+        let data;
+        try {
+            const response = await fetch(`/api/dict_occurrences/${encodeURIComponent(pdfName)}?phrase=${encodeURIComponent(phrase)}`);
+            data = await response.json();
+        } catch (error) {
+            console.error("findTermOccurrencesエラー:", error);
+            alert("出現箇所の取得エラー: " + error);
+            return;
         }
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.status === "ok") {
-            alert("自動タグ付けが成功しました");
-            // 必要に応じて、book_data の再取得などを実施
+        if (data.status !== "ok") {
+            alert("出現箇所の取得エラー: " + data.message);
+            return;
+        }
+        // 索引の段落idを、本の段落の並び順にそろえる
+        const ids = new Set(data.book ? data.book.paragraph_ids : []);
+        termOccurrences = {
+            phrase: phrase,
+            paragraphs: bookData.paragraphs.filter(p => ids.has(String(p.id))),
+            position: -1,
+            otherBooks: data.books.filter(b => !data.book || b.book !== data.book.book).length,
+        };
+    }
+
+    const found = termOccurrences.paragraphs;
+    const others = termOccurrences.otherBooks ? `（他の本 ${termOccurrences.otherBooks} 冊）` : "";
+    if (found.length === 0) {
+        status.textContent = `見つかりません${others}`;
+        return;
+    }
+    termOccurrences.position = (termOccurrences.position + 1) % found.length;
+    const p = found[termOccurrences.position];
+    status.textContent = `${termOccurrences.position + 1}/${found.length}${others}`;
+
+    const scroll = () => {
+        const target = document.getElementById(`paragraph-${p.id}`);
+        if (target) {
+            target.scrollIntoView({ behavior: "smooth", block: "center" });
+        }
+    };
+    if (p.page !== currentPage) {
+        jumpToPage(p.page);
+        setTimeout(scroll, 500);
+    } else {
+        scroll();
+    }
+}
+
+// 実行中のジョブ（同時に1つだけ表示する）
+var currentJobId = null;
+
+// 時間のかかる処理をバックグラウンドのジョブとして開始し、完了まで進捗を表示する
+// onDone はジョブが正常に終了したときに呼ばれる
+async function runJob(url, form, label, onDone = null) {
+    let data;
+    try {
+        let response = await fetch(url, { method: 'POST', body: form || new FormData() });
+        data = await response.json();
+    } catch (error) {
+        console.error(`${label} error:`, error);
+        alert(`${label}中にエラーが発生しました`);
+        return;
+    }
+    if (data.status !== "ok") {
+        alert(`${label}エラー: ` + data.message);
+        return;
+    }
+    if (!data.job_id) {
+        // ジョブを使わずに終わった場合（抽出済みなど）
+        alert(data.message || `${label}が完了しました`);
+        return;
+    }
+
+    currentJobId = data.job_id;
+    showJobProgress(label, null);
+    let events = new EventSource(`/api/jobs/${data.job_id}/events`);
+    events.onmessage = (event) => {
+        let job = JSON.parse(event.data);
+        showJobProgress(label, job);
+        if (job.status === "queued" || job.status === "running") return;
+
+        events.close();
+        currentJobId = null;
+        if (job.status === "done") {
+            alert(`${label}が成功しました`);
+            if (onDone) onDone(job);
+        } else if (job.status === "cancelled") {
+            alert(`${label}を中止しました`);
             fetchBookData();
         } else {
-            alert("自動タグ付けエラー: " + data.message);
+            alert(`${label}エラー: ` + job.message);
         }
-    })
-    .catch(error => {
-        console.error("autoTagging error:", error);
-        alert("自動タグ付け中にエラーが発生しました");
-    });
+    };
+    events.onerror = (error) => {
+        // 接続が切れた場合はブラウザが自動で再接続する
+        console.error(`${label} progress error:`, error);
+    };
 }
 
-function dictCreate() {
-    fetch(`/api/dict_create/${encodeURIComponent(pdfName)}`, {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/x-www-form-urlencoded'
+// ジョブの進捗（件数、送信文字数、残り時間）を表示する。job が null なら開始直後
+function showJobProgress(label, job) {
+    let status = document.getElementById("jobStatus");
+    let cancelButton = document.getElementById("jobCancelButton");
+    let active = !job || job.status === "queued" || job.status === "running";
+    status.hidden = !active;
+    cancelButton.hidden = !active;
+    if (!job) {
+        status.innerText = `${label}: 開始しています...`;
+        return;
+    }
+    let text = `${label}: `;
+    if (job.status === "queued") {
+        text += "待機中";
+    } else {
+        text += `${job.done}/${job.total} ${job.unit}`;
+        if (job.percent !== null) text += ` (${job.percent}%)`;
+        if (job.chars) text += ` 送信 ${job.chars.toLocaleString()} 文字`;
+        if (job.eta_seconds !== null) text += ` 残り約 ${Math.ceil(job.eta_seconds)} 秒`;
+    }
+    if (job.cancel_requested) text += " 中止しています...";
+    status.innerText = text;
+}
+
+// 実行中のジョブを中止する
+function cancelJob() {
+    if (!currentJobId) return;
+    if (!confirm("実行中の処理を中止します。よろしいですか？")) return;
+    fetch(`/api/jobs/${currentJobId}/cancel`, { method: 'POST' })
+        .catch(error => console.error("cancelJob error:", error));
+}
+
+
+// 差分保存で比較するパラグラフの項目
+const DELTA_FIELDS = ['page', 'order', 'src_text', 'trans_text', 'trans_status', 'block_tag', 'parent_id'];
+
+// サーバーに保存済みの状態（id -> 項目の値）
+var savedParagraphs = {};
+
+// bookDataの現在の状態を保存済みとして記録する
+function snapshotParagraphs() {
+    savedParagraphs = {};
+    for (let p of bookData.paragraphs || []) {
+        let saved = {};
+        for (let key of DELTA_FIELDS) {
+            saved[key] = p[key];
         }
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.status === "ok") {
-            alert("辞書生成が成功しました");
-        } else {
-            alert("辞書生成エラー: " + data.message);
+        savedParagraphs[String(p.id)] = saved;
+    }
+}
+
+// サーバーに送った項目の値だけを保存済みとして記録する（送っていない項目の未保存の変更は残す）
+function markParagraphSaved(id, fields) {
+    let saved = savedParagraphs[String(id)];
+    if (!saved) return;
+    for (let key of Object.keys(fields)) {
+        saved[key] = fields[key];
+    }
+}
+
+// 保存済みの状態から変わった項目だけを [{id, fields}] で返す
+function collectParagraphChanges() {
+    let changes = [];
+    for (let p of bookData.paragraphs) {
+        let saved = savedParagraphs[String(p.id)];
+        if (!saved) continue;
+        let fields = {};
+        for (let key of DELTA_FIELDS) {
+            if (p[key] !== saved[key]) {
+                fields[key] = p[key];
+            }
         }
-    })
-    .catch(error => {
-        console.error("autoTagging error:", error);
-        alert("辞書生成中にエラーが発生しました");
-    });
+        if (Object.keys(fields).length > 0) {
+            changes.push({ id: p.id, fields: fields });
+        }
+    }
+    return changes;
 }
 
-function dictTrans() {
-    fetch(`/api/dict_trans/${encodeURIComponent(pdfName)}`, {
+// 変更のあった項目だけをサーバーに送る。他で更新されていた場合は再読み込みする
+async function patchParagraphs(changes, title = null) {
+    let body = { version: bookData.version || 0, changes: changes };
+    if (title !== null) {
+        body.title = title;
+    }
+    let response = await fetch(`/api/patch_paragraphs/${encodeURIComponent(pdfName)}`, {
         method: 'POST',
         headers: {
-            'Content-Type': 'application/x-www-form-urlencoded'
-        }
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.status === "ok") {
-            alert("辞書翻訳が成功しました");
-        } else {
-            alert("辞書翻訳エラー: " + data.message);
-        }
-    })
-    .catch(error => {
-        console.error("autoTagging error:", error);
-        alert("辞書翻訳中にエラーが発生しました");
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify(body)
     });
+    let data = await response.json();
+    if (data.status === "conflict") {
+        alert(data.message);
+        await fetchBookData();
+        return false;
+    }
+    if (data.status !== "ok") {
+        throw new Error(data.message);
+    }
+    bookData.version = data.version;
+    warnSaveError(data);
+    if (title !== null) {
+        bookData.title = title;
+    }
+    bookData.trans_status_counts = data.trans_status_counts;
+    updateTransStatusCounts(bookData.trans_status_counts);
+    for (let change of changes) {
+        markParagraphSaved(change.id, change.fields);
+    }
+    return true;
 }
 
+// 構成（パラグラフの変更とタイトル）を差分で保存する
+async function saveStructure() {
+    let changes = collectParagraphChanges();
+    let title = document.getElementById('titleInput').value;
+    if (changes.length === 0 && title === bookData.title) {
+        alert('変更はありません');
+        return;
+    }
+    try {
+        if (await patchParagraphs(changes, title)) {
+            alert(`構成を保存しました（${changes.length}件）`);
+        }
+    } catch (error) {
+        console.error('Error saving structure:', error);
+        alert('構成保存中にエラーが発生しました: ' + error.message);
+    }
+}
 
 // 順序再発行＆保存処理
-function saveOrder() {
+// 表示中のページの並びで order を振り直し、変わったパラグラフだけを送信する
+async function saveOrder() {
     let container = document.getElementById('srcParagraphs');
     let children = container.children;
-    let orderList = [];
+    let paragraphById = new Map(bookData.paragraphs.map(p => [String(p.id), p]));
     for (let i = 0; i < children.length; i++) {
         let idElem = children[i].querySelector('.paragraph-id');
         if (idElem) {
-            let pId = idElem.innerText.trim();
-            orderList.push({ id: pId, order: i + 1 });
+            let p = paragraphById.get(idElem.innerText.trim());
+            if (p) {
+                p.order = i + 1;
+            }
         }
     }
-    // orderListを /save_order に送信
-    let formData = new URLSearchParams();
-    formData.append('order_json', JSON.stringify(orderList));
-    formData.append('title', document.getElementById('titleInput').value);
+    let changes = collectParagraphChanges()
+        .filter(c => 'order' in c.fields)
+        .map(c => ({ id: c.id, fields: { order: c.fields.order } }));
 
-    fetch(`/api/save_order/${encodeURIComponent(pdfName)}`, {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/x-www-form-urlencoded'
-        },
-        body: formData.toString()
-    })
-    .then(response => response.json())
-    .then(data => {
-        console.log('Order saved:', data);
-        alert('順序が保存されました');
-        fetchBookData();
-    })
-    .catch(error => {
+    try {
+        if (await patchParagraphs(changes, document.getElementById('titleInput').value)) {
+            console.log('Order saved:', changes.length);
+            alert('順序が保存されました');
+            renderParagraphs();
+        }
+    } catch (error) {
         console.error('Error saving order:', error);
-        alert('順序保存中にエラーが発生しました');
-    });
+        alert('順序保存中にエラーが発生しました: ' + error.message);
+    }
 }
 
 function exportHtml() {
@@ -262,6 +262,13 @@ function updateParagraphData(paragraphs, updatedParagraph) {
 
 // 編集パラグラフのデータをJSONに保存
 function saveParagraphData(paragraph) {
+    // 送る項目（保存に成功したらこの値だけを保存済みとして記録する）
+    let sentFields = {
+        src_text: paragraph.src_text,
+        trans_text: paragraph.trans_text,
+        trans_status: paragraph.trans_status,
+        block_tag: paragraph.block_tag
+    };
     fetch(`/api/update_paragraph/${encodeURIComponent(pdfName)}`, {
         method: 'POST',
         headers: {
@@ -269,10 +276,10 @@ function saveParagraphData(paragraph) {
         },
         body: JSON.stringify({
             paragraph_id: paragraph.id,
-            new_src_text: paragraph.src_text,
-            new_trans_text: paragraph.trans_text,
-            trans_status: paragraph.trans_status,
-            block_tag: paragraph.block_tag
+            new_src_text: sentFields.src_text,
+            new_trans_text: sentFields.trans_text,
+            trans_status: sentFields.trans_status,
+            block_tag: sentFields.block_tag
         })
     })
     .then(response => response.json())
@@ -283,6 +290,9 @@ function saveParagraphData(paragraph) {
             console.log('Success:', data);
             // サーバーへの保存が成功した場合のみクライアント側を更新
             updateParagraphData(bookData.paragraphs, paragraph);
+            bookData.version = data.version;
+            markParagraphSaved(paragraph.id, sentFields);
+            warnSaveError(data);
             updateTransStatusCounts(bookData.trans_status_counts);
         } else {
             console.error('Error:', data.message);
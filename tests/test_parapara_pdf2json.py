@@ -0,0 +1,79 @@
+"""
+parapara_pdf2json のページ指定の再抽出（reextract_pages）のテスト。
+ページをまたぐ段落がある PDF で、一部のページだけを再抽出しても全体の抽出と同じ段落になることを確かめる。
+"""
+
+import json
+import os
+import sys
+
+import fitz
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "modules"))
+
+from parapara_pdf2json import extract_paragraphs  # noqa: E402
+
+# 1ページ目の2つ目の段落は、ハイフンで2ページ目に続く
+PAGES = [
+    ["First paragraph on page one.", "This paragraph runs across the page break and con-"],
+    ["tinues on page two until here.", "Second paragraph on page two."],
+    ["Third page paragraph."],
+]
+
+
+def paragraph_texts(book_data):
+    return [(p["page"], p["src_text"]) for p in book_data["paragraphs"] if p["page"]]
+
+
+@pytest.fixture
+def book(tmp_path):
+    pdf_path = str(tmp_path / "book.pdf")
+    json_path = str(tmp_path / "book.json")
+    doc = fitz.open()
+    for lines in PAGES:
+        page = doc.new_page()
+        for i, line in enumerate(lines):
+            page.insert_text((72, 72 + 40 * i), line, fontsize=11)
+    doc.save(pdf_path)
+    doc.close()
+    extract_paragraphs(pdf_path, json_path)
+    with open(json_path, encoding="utf-8") as f:
+        return pdf_path, json_path, json.load(f)
+
+
+def test_full_extraction_joins_cross_page_paragraph(book):
+    _, _, book_data = book
+    assert paragraph_texts(book_data) == [
+        (1, "First paragraph on page one."),
+        (1, "This paragraph runs across the page break and con-tinues on page two until here."),
+        (2, "Second paragraph on page two."),
+        (3, "Third page paragraph."),
+    ]
+
+
+@pytest.mark.parametrize("pages", [[1], [2], [3], [1, 3], [2, 3], [1, 2, 3]])
+def test_reextract_keeps_cross_page_paragraph(book, pages):
+    pdf_path, json_path, book_data = book
+    result = extract_paragraphs(pdf_path, json_path, pages=pages)
+    assert paragraph_texts(result) == paragraph_texts(book_data)
+    with open(json_path, encoding="utf-8") as f:
+        assert paragraph_texts(json.load(f)) == paragraph_texts(book_data)
+
+
+def test_reextract_carries_over_translation_of_widened_page(book):
+    pdf_path, json_path, book_data = book
+    for p in book_data["paragraphs"]:
+        if p["page"] == 1:
+            p["trans_text"] = "訳:" + p["src_text"]
+            p["trans_status"] = "fixed"
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(book_data, f, ensure_ascii=False)
+
+    # 2ページ目だけを指定しても、2ページ目に続く1ページ目の段落ごと作り直し、訳文は引き継ぐ
+    result = extract_paragraphs(pdf_path, json_path, pages=[2])
+    page_one = [p for p in result["paragraphs"] if p["page"] == 1]
+    assert [p["trans_status"] for p in page_one] == ["fixed", "fixed"]
+    assert all(p["trans_text"] == "訳:" + p["src_text"] for p in page_one)
+    ids = [p["id"] for p in result["paragraphs"]]
+    assert len(ids) == len(set(ids))